@@ -0,0 +1,223 @@
+"""
+Замеры производительности функций rsa_utils и кэша разбора certs.
+Запуск:
+    python bench.py                                   # все размеры, JSON в stdout
+    python bench.py --bits 256 1024 --output bench.json
+    python bench.py --baseline bench_baseline.json --threshold 0.2
+    python bench.py egcd --bits 256 1024 4096 8192
+    python bench.py batch --bits 512 1024 --repeat 5
+    python bench.py certs --bits 1024 2048
+
+Размер (bits) — длина модуля n; простые числа имеют длину bits // 2.
+При --baseline медианы сравниваются с сохранённым файлом, и при замедлении
+больше чем на threshold хотя бы одной функции процесс завершается с кодом 1.
+"""
+
+import argparse, json, math, statistics, sys, time
+import rsa_utils as ru
+import certs
+
+DEFAULT_BITS = [64, 256, 512, 1024, 2048, 4096]
+
+def egcd_recursive(a, b):
+    """Прежняя рекурсивная версия egcd — для сравнения."""
+    if a == 0:
+        return b, 0, 1
+    gcd_val, x1, y1 = egcd_recursive(b % a, a)
+    return gcd_val, y1 - (b // a) * x1, x1
+
+def parse_key_freeze(data):
+    """Прежний ключ кэша разбора (рекурсивный _freeze всего JSON) — для сравнения."""
+    return (certs.content_key(data), certs._freeze(data.get("signature")))
+
+def timed(fn, repeat):
+    """Время одного вызова fn() в секундах для каждого из repeat повторов."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def summarize(samples):
+    """Медиана, 95-й перцентиль (по рангу) и операций в секунду."""
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    p95 = ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+    return {
+        "median_s": median,
+        "p95_s": p95,
+        "ops_per_sec": 1 / median if median else float("inf"),
+        "repeat": len(ordered),
+    }
+
+def bench_rsa(bits_list, repeat, keygen_repeat, seed):
+    """
+    Замер основных функций rsa_utils для каждого размера модуля.
+    Перед каждым размером генератор случайных чисел сбрасывается в seed,
+    поэтому кандидаты в простые и сообщения совпадают от запуска к запуску.
+    """
+    results = {}
+    for bits in bits_list:
+        ru.set_seed(seed)
+        half = bits // 2
+        keys = ru.generate_rsa_keys(half)
+        pub = keys["public"]
+        priv = ru.load_private_key(ru.export_private_key(keys))
+        n = pub[1]
+        m_int = ru.my_randint(2, n - 1)
+        s_int = ru.rsa_sign(m_int, priv)
+        c_int = ru.rsa_encrypt(m_int, pub)
+        text = "ж" * max(1, bits // 16)  # bits // 8 байт в UTF-8
+        t_int = ru.text_to_int(text)
+        cases = [
+            ("generate_prime", lambda: ru.generate_prime(half), keygen_repeat),
+            ("generate_rsa_keys", lambda: ru.generate_rsa_keys(half), keygen_repeat),
+            ("rsa_sign", lambda: ru.rsa_sign(m_int, priv), repeat),
+            ("rsa_verify", lambda: ru.rsa_verify(m_int, s_int, pub), repeat),
+            ("rsa_encrypt", lambda: ru.rsa_encrypt(m_int, pub), repeat),
+            ("rsa_decrypt", lambda: ru.rsa_decrypt(c_int, priv), repeat),
+            ("text_to_int", lambda: ru.text_to_int(text), repeat),
+            ("int_to_text", lambda: ru.int_to_text(t_int), repeat),
+        ]
+        results[str(bits)] = {name: summarize(timed(fn, count)) for name, fn, count in cases}
+    return results
+
+def bench_egcd(bits_list, repeat):
+    """
+    egcd и mod_inverse для операндов разной длины.
+    Для рекурсивной версии фиксируется RecursionError на длинных операндах.
+    """
+    results = {}
+    for bits in bits_list:
+        e = 65537
+        phi = ru.my_getrandbits(bits) | (1 << (bits - 1))
+        b = ru.my_getrandbits(bits) | 1
+        row = {}
+        for name, fn in (("egcd", lambda: ru.egcd(b, phi)),
+                         ("egcd_recursive", lambda: egcd_recursive(b, phi)),
+                         ("mod_inverse", lambda: ru.mod_inverse(e, phi))):
+            try:
+                row[name] = summarize(timed(fn, repeat))
+            except RecursionError:
+                row[name] = "RecursionError"
+        results[str(bits)] = row
+    return results
+
+def bench_batch(bits_list, repeat, batch_size=200):
+    """
+    rsa_verify в цикле против rsa_verify_batch для batch_size подписей одного ключа:
+    со стандартной e = 65537 и с e длиной в модуль.
+    """
+    results = {}
+    for bits in bits_list:
+        keys = ru.generate_rsa_keys(bits // 2)
+        p, q = keys["p"], keys["q"]
+        n, phi = p * q, (p - 1) * (q - 1)
+        big_e = ru.my_getrandbits(bits - 2) | 1
+        while ru.egcd(big_e, phi)[0] != 1:
+            big_e += 2
+        row = {}
+        for label, e in (("e65537", keys["public"][0]), ("e_full", big_e)):
+            d = ru.mod_inverse(e, phi)
+            items = []
+            for _ in range(batch_size):
+                m_int = ru.my_randint(2, n - 1)
+                items.append((m_int, ru.rsa_sign(m_int, (d, n)), (e, n)))
+            row[f"loop_{label}"] = summarize(timed(lambda: [ru.rsa_verify(*it) for it in items], repeat))
+            row[f"batch_{label}"] = summarize(timed(lambda: ru.rsa_verify_batch(items), repeat))
+        results[str(bits)] = row
+    return results
+
+def bench_certs(bits_list, repeat, chain_size=3, rounds=1000):
+    """
+    Повторный разбор цепочки из chain_size сертификатов (как при каждом
+    входящем пакете), rounds раз: ключ кэша разбора — прежний (_freeze),
+    текущий (_parse_key) и json.dumps для сравнения, и certs.parse целиком.
+    """
+    results = {}
+    for bits in bits_list:
+        keys = ru.generate_rsa_keys(bits // 2)
+        priv = ru.load_private_key(ru.export_private_key(keys))
+        pubkey = {"e": keys["public"][0], "n": keys["public"][1]}
+        chain = []
+        for i in range(chain_size):
+            cert = certs.Certificate(f"subject-{i}", "issuer", pubkey)
+            cert.attach_signature(ru.rsa_sign_bytes(cert.tbs_bytes, priv))
+            chain.append(cert.to_json())
+        # Свежие словари на каждый раунд, как после json.loads пакета
+        packets = [json.loads(json.dumps(chain)) for _ in range(rounds)]
+        for data in packets[0]:
+            certs.parse(data)
+        cases = [
+            ("key_freeze", lambda: [parse_key_freeze(d) for p in packets for d in p]),
+            ("key_flat", lambda: [certs._parse_key(d) for p in packets for d in p]),
+            ("json_dumps", lambda: [json.dumps(d, sort_keys=True) for p in packets for d in p]),
+            ("parse_cached", lambda: [certs.parse(d) for p in packets for d in p]),
+        ]
+        results[str(bits)] = {name: summarize(timed(fn, repeat)) for name, fn in cases}
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Список регрессий: (bits, функция, базовая медиана, текущая медиана)
+    для функций, замедлившихся больше чем на threshold (0.2 = 20 %).
+    """
+    regressions = []
+    for bits, row in results.items():
+        for name, cur in row.items():
+            base = baseline.get(bits, {}).get(name)
+            if not isinstance(cur, dict) or not isinstance(base, dict):
+                continue
+            if cur["median_s"] > base["median_s"] * (1 + threshold):
+                regressions.append((bits, name, base["median_s"], cur["median_s"]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("suite", nargs="?", choices=["rsa", "egcd", "batch", "certs"], default="rsa")
+    parser.add_argument("--bits", type=int, nargs="+", default=None, help="размеры модуля")
+    parser.add_argument("--repeat", type=int, default=50, help="повторов для быстрых функций")
+    parser.add_argument("--keygen-repeat", type=int, default=5, help="повторов для генерации ключей")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend", choices=sorted(ru.POW_BACKENDS), default=ru.pow_backend)
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    parser.add_argument("--baseline", help="файл с базовыми результатами для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление медианы")
+    args = parser.parse_args()
+
+    ru.set_pow_backend(args.backend)
+    if args.suite == "egcd":
+        ru.set_seed(args.seed)
+        results = bench_egcd(args.bits or [256, 512, 1024, 2048, 4096, 8192], args.repeat)
+    elif args.suite == "batch":
+        ru.set_seed(args.seed)
+        results = bench_batch(args.bits or [512, 1024, 2048], args.repeat)
+    elif args.suite == "certs":
+        results = bench_certs(args.bits or [1024, 2048], args.repeat)
+    else:
+        results = bench_rsa(args.bits or DEFAULT_BITS, args.repeat, args.keygen_repeat, args.seed)
+    report = {
+        "suite": args.suite,
+        "seed": args.seed,
+        "backend": args.backend,
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for bits, name, base, cur in regressions:
+            print(f"РЕГРЕССИЯ {name} @ {bits} бит: {base * 1e3:.3f} мс -> {cur * 1e3:.3f} мс",
+                  file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -4,61 +4,98 @@
     python ca_node.py --name "CA A" --port 8001 --root-url http://localhost:8000
 Запуск CA B:
     python ca_node.py --name "CA B" --port 8002 --root-url http://localhost:8000
+Несколько процессов uvicorn с общим хранилищем SQLite:
+    python ca_node.py --name "CA A" --port 8001 --workers 4
 """
 
-import argparse, json, requests, threading
+import argparse, asyncio, json, os, threading
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 import rsa_utils as ru
+import certs
+import http_cache
+from transport import default_transport as transport
+import key_pool
+from signing_executor import SigningExecutor
+from cert_store import CertStore, SqliteCertStore
+from issuance import IssuanceCoordinator, atomic_create_text
 
 # Подготовка параметров командной строки
 parser = argparse.ArgumentParser()
 parser.add_argument("--name", required=True, help="имя УЦ (CA A / CA B)")
 parser.add_argument("--port", type=int, required=True)
 parser.add_argument("--root-url", default="http://localhost:8000")
+parser.add_argument("--key-primes", type=int, default=2, help="простых в модуле ключа УЦ (> 2 — многопростой RSA)")
+parser.add_argument("--sign-workers", type=int, default=None, help="процессов для подписи (по умолчанию — по числу ядер)")
+parser.add_argument("--sign-queue", type=int, default=64, help="максимум запросов на подпись в очереди")
+parser.add_argument("--workers", type=int, default=1, help="процессов uvicorn")
+parser.add_argument("--store", choices=["log", "sqlite"], default=None,
+                    help="хранилище сертификатов (по умолчанию log, при --workers > 1 — sqlite)")
 args = parser.parse_args()
+if args.store is None:
+    args.store = "sqlite" if args.workers > 1 else "log"
+if args.workers > 1 and args.store != "sqlite":
+    parser.error("--workers > 1 требует общего хранилища --store sqlite")
 
 CA_DIR   = Path(__file__).parent / args.name.replace(" ", "_")
 CA_DIR.mkdir(exist_ok=True)
 
 KEY_FILE  = CA_DIR / "ca_key.json"
 CERT_FILE = CA_DIR / "ca_cert.json"
+ROOT_CERT_FILE = CA_DIR / "root_cert.json"
 DB_FILE   = CA_DIR / "clients.json"
+SQLITE_FILE = CA_DIR / "certs.sqlite"
+
+def load_or_create(path, make):
+    """
+    Прочитать JSON-файл или создать его из make().
+    Все процессы УЦ стартуют одновременно, но файл создаёт только один,
+    остальные читают его содержимое — ключ и сертификаты у всех общие.
+    """
+    if not path.exists():
+        atomic_create_text(path, json.dumps(make()))
+    return json.loads(path.read_text())
 
 # Инициализация криптографических ключей
-def init_keys():
-    if KEY_FILE.exists():
-        key = json.loads(KEY_FILE.read_text())
-    else:
-        k = ru.generate_rsa_keys(bits=256)
-        key = {"d": k["private"][0], "n": k["private"][1],
-               "e": k["public"][0]}
-        KEY_FILE.write_text(json.dumps(key))
-    return key
-
-ca_key = init_keys()
-
-# Получение корневого сертификата
-root_cert = requests.get(f"{args.root_url}/ca_cert").json()
+ca_key = load_or_create(KEY_FILE, lambda: ru.export_private_key(key_pool.take(256, primes=args.key_primes)))
+ca_privkey = ru.load_private_key(ca_key)
+# Ядра делятся между процессами uvicorn
+signer = SigningExecutor(workers=args.sign_workers or max(1, (os.cpu_count() or 1) // args.workers),
+                         max_queue=args.sign_queue)
+
+def fetch_cert(method, url, **kwargs):
+    """
+    Сертификат от корневого УЦ. Ответ с ошибкой или тело, не являющееся
+    сертификатом, вызывают исключение и не попадают в файл load_or_create.
+    """
+    resp = transport.request(method, url, **kwargs)
+    resp.raise_for_status()
+    data = resp.json()
+    certs.Certificate.from_json(data)  # ValueError для {"detail": ...} и неполного тела
+    return data
+
+# Корневой сертификат запрашивается один раз и хранится в каталоге УЦ
+root_cert = certs.Certificate.from_json(
+    load_or_create(ROOT_CERT_FILE, lambda: fetch_cert("GET", f"{args.root_url}/ca_cert")))
 
 # Получение собственного сертификата от корневого УЦ
-if CERT_FILE.exists():
-    ca_cert = json.loads(CERT_FILE.read_text())
-else:
+def request_ca_cert():
     csr = {
         "subject": args.name,
         "pubkey": {"e": ca_key["e"], "n": ca_key["n"]}
     }
-    ca_cert = requests.post(f"{args.root_url}/sign", json=csr).json()
-    CERT_FILE.write_text(json.dumps(ca_cert))
+    return fetch_cert("POST", f"{args.root_url}/sign", json=csr)
 
-# База данных выданных клиентских сертификатов
-if DB_FILE.exists():
-    client_db = json.loads(DB_FILE.read_text())
+ca_cert = certs.Certificate.from_json(load_or_create(CERT_FILE, request_ca_cert))
+
+# Хранилище выданных клиентских сертификатов: журнал с индексом для одного
+# процесса или SQLite, общий для всех процессов; clients.json переносится при первом запуске
+if args.store == "sqlite":
+    store = SqliteCertStore(SQLITE_FILE, legacy_file=DB_FILE)
 else:
-    client_db = {}
-    DB_FILE.write_text(json.dumps(client_db))
+    store = CertStore(CA_DIR, legacy_file=DB_FILE)
+issuer = IssuanceCoordinator(store)
 
 # Настройка FastAPI
 app = FastAPI(title=args.name)
@@ -67,38 +104,91 @@ class CSR(BaseModel):
     subject: str
     pubkey: dict
 
+class CSRBatch(BaseModel):
+    csrs: list[CSR]
+
+def make_cert(csr):
+    """Неподписанный сертификат по запросу; ValueError при некорректном ключе."""
+    return certs.Certificate(csr.subject, args.name, csr.pubkey)
+
 @app.get("/ca_cert")
-async def get_ca_cert():
-    return ca_cert
+async def get_ca_cert(request: Request):
+    return http_cache.cert_response(request, ca_cert, http_cache.CA_CERT_MAX_AGE)
 
 @app.get("/root_cert")
-async def get_root():
-    return root_cert
+async def get_root(request: Request):
+    return http_cache.cert_response(request, root_cert, http_cache.CA_CERT_MAX_AGE)
 
 @app.post("/sign")
 async def sign_client(csr: CSR):
-    if csr.subject in client_db:
+    try:
+        cert = make_cert(csr)
+    except ValueError as ex:
+        raise HTTPException(400, str(ex))
+    # Резерв субъекта: параллельный запрос того же субъекта получит отказ
+    if not await asyncio.to_thread(issuer.reserve, csr.subject):
         raise HTTPException(400, "Сертификат уже выдан")
-    body = {
-        "subject": csr.subject,
-        "issuer": args.name,
-        "pubkey": csr.pubkey,
-    }
-    to_sign = ru.text_to_int(json.dumps(body, sort_keys=True))
-    body["signature"] = ru.rsa_sign(to_sign, (ca_key["d"], ca_key["n"]))
-
-    client_db[csr.subject] = body
-    DB_FILE.write_text(json.dumps(client_db))
+    try:
+        with signer.overload_as_503():
+            cert.attach_signature(await signer.sign(cert.tbs_bytes, ca_privkey))
+        body = cert.to_json()
+        if not await asyncio.to_thread(store.add, csr.subject, body):
+            raise HTTPException(400, "Сертификат уже выдан")
+    finally:
+        await asyncio.to_thread(issuer.release, csr.subject)
     return body
 
+@app.post("/sign_batch")
+async def sign_client_batch(batch: CSRBatch):
+    """
+    Выдача сертификатов по списку запросов: подписи вычисляются параллельно
+    в пуле процессов, вся партия записывается в хранилище одной транзакцией.
+    Для каждого запроса возвращается {"ok": true, "cert": ...} или {"ok": false, "error": ...}.
+    """
+    results = [None] * len(batch.csrs)
+    candidates = []  # (индекс, сертификат)
+    for i, csr in enumerate(batch.csrs):
+        try:
+            candidates.append((i, make_cert(csr)))
+        except ValueError as ex:
+            results[i] = {"ok": False, "error": str(ex)}
+    pending = []
+    try:
+        # Всё после резервирования — внутри try: зарезервированные субъекты освобождаются в finally
+        reserved = await asyncio.to_thread(issuer.reserve_many, [cert.subject for _, cert in candidates])
+        for (i, cert), ok in zip(candidates, reserved):
+            if ok:
+                pending.append((i, cert))
+            else:
+                results[i] = {"ok": False, "error": "Сертификат уже выдан"}
+
+        with signer.overload_as_503():
+            signatures = await signer.sign_many([cert.tbs_bytes for _, cert in pending], ca_privkey)
+
+        bodies = []
+        for (_, cert), signature in zip(pending, signatures):
+            cert.attach_signature(signature)
+            bodies.append(cert.to_json())
+        added = await asyncio.to_thread(store.add_many, [(body["subject"], body) for body in bodies])
+        for (i, _), body, ok in zip(pending, bodies, added):
+            results[i] = {"ok": True, "cert": body} if ok else {"ok": False, "error": "Сертификат уже выдан"}
+    finally:
+        await asyncio.to_thread(issuer.release_many, [cert.subject for _, cert in pending])
+    return {"results": results}
+
 @app.get("/cert/{client_id}")
-async def get_client_cert(client_id: str):
-    cert = client_db.get(client_id)
+async def get_client_cert(client_id: str, request: Request):
+    cert = await asyncio.to_thread(store.get, client_id)
     if not cert:
         raise HTTPException(404, "Неизвестный клиент")
-    return cert
+    return http_cache.cert_response(request, certs.parse(cert), http_cache.CLIENT_CERT_MAX_AGE)
+
+@app.get("/stats")
+async def get_stats():
+    return {"signing": signer.stats(), "issuance": issuer.stats(), "certificates": len(store)}
 
 # Запуск сервера
 if __name__ == "__main__":
     import uvicorn, sys
-    uvicorn.run("ca_node:app", host="0.0.0.0", port=args.port, log_level="info")
+    # Процессы uvicorn заново импортируют ca_node и разбирают те же аргументы
+    uvicorn.run("ca_node:app", host="0.0.0.0", port=args.port, log_level="info", workers=args.workers)
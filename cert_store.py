@@ -0,0 +1,409 @@
+"""
+Хранилище выданных сертификатов УЦ: журнал с дозаписью и индекс по субъекту.
+
+Файлы в каталоге УЦ:
+  certs.meta        — {"generation": g}, заменяется атомарно;
+  certs-<g>.log     — сертификаты, по одной JSON-строке, только дозапись;
+  certs-<g>.idx     — индекс, строки JSON [subject, offset, length], только дозапись.
+
+В памяти держится только индекс (субъект -> смещение и длина записи),
+сами сертификаты читаются из журнала по запросу. Записи подтверждаются
+групповым fsync: один fsync покрывает все записи, накопленные, пока шёл
+предыдущий. Когда доля заменённых записей велика, журнал уплотняется в
+новое поколение файлов. Старый clients.json переносится при первом запуске.
+
+CertStore рассчитан на один процесс. Для нескольких процессов УЦ с общим
+состоянием — SqliteCertStore с тем же интерфейсом.
+"""
+
+import json, os, sqlite3, threading, time, uuid
+from contextlib import contextmanager
+from pathlib import Path
+from issuance import atomic_write_text
+
+class CertStore:
+    def __init__(self, directory, legacy_file=None, compact_ratio=0.5, compact_min_bytes=1 << 20):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compact_ratio = compact_ratio          # Доля мёртвых байт для уплотнения
+        self.compact_min_bytes = compact_min_bytes  # Меньшие журналы не уплотняются
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._meta_file = self.directory / "certs.meta"
+        if self._meta_file.exists():
+            self._generation = json.loads(self._meta_file.read_text())["generation"]
+        else:
+            self._generation = 0
+        self._remove_stale_generations()
+        self._open()
+        if legacy_file is not None:
+            self._migrate(Path(legacy_file))
+
+    # ---------- файлы и восстановление ----------
+    def _paths(self, generation):
+        return (self.directory / f"certs-{generation}.log",
+                self.directory / f"certs-{generation}.idx")
+
+    def _remove_stale_generations(self):
+        """Удалить файлы поколений, оставшиеся от прерванного уплотнения."""
+        current = {path.name for path in self._paths(self._generation)}
+        for path in list(self.directory.glob("certs-*.log")) + list(self.directory.glob("certs-*.idx")):
+            if path.name not in current:
+                path.unlink()
+
+    def _open(self):
+        log_path, idx_path = self._paths(self._generation)
+        log_path.touch()
+        idx_path.touch()
+        log_size = log_path.stat().st_size
+        self._index = {}   # subject -> (offset, length)
+        self._dead = 0     # Байты заменённых записей
+        indexed_end = 0
+        entries = []
+        with open(idx_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Недописанная строка после сбоя
+                subject, offset, length = json.loads(line)
+                if offset + length > log_size:
+                    break  # Индекс опередил журнал: запись журнала не дошла до диска
+                entries.append(line)
+                self._replace_index(subject, offset, length)
+                indexed_end = max(indexed_end, offset + length)
+        # Индекс переписывается без отброшенного хвоста
+        with open(idx_path, "wb") as f:
+            f.write(b"".join(entries))
+        self._log = open(log_path, "ab")
+        self._idx = open(idx_path, "ab")
+        self._reader = open(log_path, "rb")
+        self._recover_tail(indexed_end)
+        self._log_end = self._log.tell()
+        self._synced = self._log_end
+
+    def _recover_tail(self, indexed_end):
+        """
+        Дописать в индекс записи журнала после indexed_end (сбой между записью
+        журнала и индекса) и отрезать недописанную последнюю строку журнала.
+        """
+        self._reader.seek(indexed_end)
+        offset = indexed_end
+        for line in self._reader:
+            if not line.endswith(b"\n"):
+                break
+            subject = json.loads(line)["subject"]
+            self._replace_index(subject, offset, len(line))
+            self._idx.write(json.dumps([subject, offset, len(line)]).encode() + b"\n")
+            offset += len(line)
+        self._log.truncate(offset)
+        self._log.seek(offset)
+        self._idx.flush()
+
+    def _replace_index(self, subject, offset, length):
+        old = self._index.get(subject)
+        if old is not None:
+            self._dead += old[1]
+        self._index[subject] = (offset, length)
+
+    def _migrate(self, legacy_file):
+        """
+        Перенос сертификатов из clients.json при первом запуске. Если прошлый
+        перенос прервался до переименования файла, уже перенесённые субъекты
+        пропускаются (add_many) и дописываются только недостающие.
+        """
+        if not legacy_file.exists():
+            return
+        client_db = json.loads(legacy_file.read_text())
+        self.add_many(client_db.items())
+        os.replace(legacy_file, legacy_file.with_name(legacy_file.name + ".migrated"))
+
+    # ---------- чтение ----------
+    def __contains__(self, subject):
+        return subject in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def subjects(self):
+        return list(self._index)
+
+    def get(self, subject):
+        """Сертификат субъекта или None (одно чтение из журнала)."""
+        with self._read_lock:
+            entry = self._index.get(subject)
+            if entry is None:
+                return None
+            offset, length = entry
+            self._reader.seek(offset)
+            line = self._reader.read(length)
+        return json.loads(line)["cert"]
+
+    # ---------- запись ----------
+    def _append(self, items):
+        """
+        Дозапись пар (subject, cert) в журнал и индекс; вызывается под _write_lock.
+        Журнал сбрасывается в ОС до обновления индекса в памяти: get() читает
+        его через отдельный дескриптор и не должен увидеть запись раньше байтов.
+        """
+        log_chunk = []
+        idx_chunk = []
+        entries = []
+        offset = self._log_end
+        for subject, cert in items:
+            line = json.dumps({"subject": subject, "cert": cert}).encode() + b"\n"
+            log_chunk.append(line)
+            idx_chunk.append(json.dumps([subject, offset, len(line)]).encode() + b"\n")
+            entries.append((subject, offset, len(line)))
+            offset += len(line)
+        self._log.write(b"".join(log_chunk))
+        self._log.flush()
+        self._idx.write(b"".join(idx_chunk))
+        for entry in entries:
+            self._replace_index(*entry)
+        self._log_end = offset
+        return offset
+
+    def _sync(self, upto):
+        """
+        Групповой fsync: если пока мы ждали, другой поток уже сбросил журнал
+        дальше upto, повторный fsync не нужен.
+        """
+        with self._sync_lock:
+            if self._synced >= upto:
+                return
+            with self._write_lock:
+                self._log.flush()
+                self._idx.flush()
+                end = self._log_end
+                log_fd, idx_fd = self._log.fileno(), self._idx.fileno()
+            os.fsync(log_fd)
+            os.fsync(idx_fd)
+            self._synced = end
+        self._maybe_compact()
+
+    def put_many(self, items):
+        """Записать пары (subject, cert) с одним fsync на всю партию."""
+        items = list(items)
+        if not items:
+            return
+        with self._write_lock:
+            end = self._append(items)
+        self._sync(end)
+
+    def put(self, subject, cert):
+        self.put_many([(subject, cert)])
+
+    def add_many(self, items):
+        """
+        Записать только новых субъектов; проверка и вставка атомарны.
+        Возвращает список bool: True — записан, False — субъект уже есть.
+        """
+        items = list(items)
+        added = []
+        fresh = []
+        with self._write_lock:
+            seen = set()
+            for subject, cert in items:
+                ok = subject not in self._index and subject not in seen
+                added.append(ok)
+                if ok:
+                    seen.add(subject)
+                    fresh.append((subject, cert))
+            end = self._append(fresh) if fresh else None
+        if end is not None:
+            self._sync(end)
+        return added
+
+    def add(self, subject, cert):
+        return self.add_many([(subject, cert)])[0]
+
+    # ---------- уплотнение ----------
+    def _maybe_compact(self):
+        if self._log_end >= self.compact_min_bytes and self._dead > self.compact_ratio * self._log_end:
+            self.compact()
+
+    def compact(self):
+        """
+        Переписать живые записи в новое поколение файлов и атомарно
+        переключить certs.meta; файлы старого поколения удаляются.
+        """
+        with self._sync_lock, self._write_lock, self._read_lock:
+            generation = self._generation + 1
+            log_path, idx_path = self._paths(generation)
+            self._log.flush()
+            offset = 0
+            with open(log_path, "wb") as log, open(idx_path, "wb") as idx:
+                for subject, (old_offset, length) in sorted(self._index.items(), key=lambda kv: kv[1][0]):
+                    self._reader.seek(old_offset)
+                    log.write(self._reader.read(length))
+                    idx.write(json.dumps([subject, offset, length]).encode() + b"\n")
+                    offset += length
+                log.flush(); os.fsync(log.fileno())
+                idx.flush(); os.fsync(idx.fileno())
+            atomic_write_text(self._meta_file, json.dumps({"generation": generation}))
+
+            old_paths = self._paths(self._generation)
+            for f in (self._log, self._idx, self._reader):
+                f.close()
+            for path in old_paths:
+                path.unlink()
+            self._generation = generation
+            self._open()
+
+    def close(self):
+        with self._sync_lock, self._write_lock:
+            for f in (self._log, self._idx, self._reader):
+                f.close()
+
+class SqliteCertStore:
+    """
+    Хранилище сертификатов в файле SQLite — общее для нескольких процессов
+    (uvicorn --workers N или несколько экземпляров УЦ на одном хосте).
+    Интерфейс совпадает с CertStore. Журнал WAL позволяет читать параллельно
+    с записью; уникальность субъекта обеспечивает первичный ключ таблицы.
+    Дополнительно reserve_many()/release_many() резервируют субъекты между
+    процессами на время подписи (см. IssuanceCoordinator).
+    """
+
+    RESERVATION_TTL = 60.0  # Резерв упавшего процесса снимается через TTL, с
+
+    def __init__(self, path, legacy_file=None, timeout=30.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        self._local = threading.local()  # Своё соединение у каждого потока
+        self._owner = uuid.uuid4().hex   # Владелец резервов этого процесса
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS certs (
+                subject TEXT PRIMARY KEY,
+                cert    TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS reservations (
+                subject TEXT PRIMARY KEY,
+                owner   TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+        """)
+        if legacy_file is not None:
+            self._migrate(Path(legacy_file))
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: транзакции открываются явно в _transaction()
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция с блокировкой записи с самого начала (BEGIN IMMEDIATE)."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _migrate(self, legacy_file):
+        """Перенос clients.json; при одновременном старте переносит один процесс."""
+        if not legacy_file.exists():
+            return
+        try:
+            client_db = json.loads(legacy_file.read_text())
+        except FileNotFoundError:
+            return  # Уже перенёс другой процесс
+        self.add_many(client_db.items())
+        try:
+            os.replace(legacy_file, legacy_file.with_name(legacy_file.name + ".migrated"))
+        except FileNotFoundError:
+            pass
+
+    # ---------- чтение ----------
+    def __contains__(self, subject):
+        row = self._conn().execute("SELECT 1 FROM certs WHERE subject = ?", (subject,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM certs").fetchone()[0]
+
+    def subjects(self):
+        return [row[0] for row in self._conn().execute("SELECT subject FROM certs")]
+
+    def get(self, subject):
+        row = self._conn().execute("SELECT cert FROM certs WHERE subject = ?", (subject,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    # ---------- запись ----------
+    def put_many(self, items):
+        rows = [(subject, json.dumps(cert)) for subject, cert in items]
+        if not rows:
+            return
+        with self._transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO certs (subject, cert) VALUES (?, ?)", rows)
+
+    def put(self, subject, cert):
+        self.put_many([(subject, cert)])
+
+    def add_many(self, items):
+        """Записать только новых субъектов; возвращает список bool, как CertStore.add_many."""
+        items = list(items)
+        added = []
+        if not items:
+            return added
+        with self._transaction() as conn:
+            for subject, cert in items:
+                cur = conn.execute("INSERT OR IGNORE INTO certs (subject, cert) VALUES (?, ?)",
+                                   (subject, json.dumps(cert)))
+                added.append(cur.rowcount == 1)
+        return added
+
+    def add(self, subject, cert):
+        return self.add_many([(subject, cert)])[0]
+
+    # ---------- резервирование между процессами ----------
+    def reserve_many(self, subjects):
+        """
+        Резерв списка субъектов одной транзакцией (один fsync на партию).
+        Возвращает список bool: False — субъект уже выдан, зарезервирован
+        другим процессом или повторяется в списке.
+        """
+        subjects = list(subjects)
+        if not subjects:
+            return []
+        now = time.time()
+        reserved = []
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM reservations WHERE expires < ?", (now,))
+            for subject in subjects:
+                if conn.execute("SELECT 1 FROM certs WHERE subject = ?", (subject,)).fetchone():
+                    reserved.append(False)
+                    continue
+                cur = conn.execute("INSERT OR IGNORE INTO reservations (subject, owner, expires) VALUES (?, ?, ?)",
+                                   (subject, self._owner, now + self.RESERVATION_TTL))
+                reserved.append(cur.rowcount == 1)
+        return reserved
+
+    def reserve(self, subject):
+        """False — субъект уже выдан или зарезервирован другим процессом."""
+        return self.reserve_many([subject])[0]
+
+    def release_many(self, subjects):
+        rows = [(subject, self._owner) for subject in subjects]
+        if not rows:
+            return
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM reservations WHERE subject = ? AND owner = ?", rows)
+
+    def release(self, subject):
+        self.release_many([subject])
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,276 @@
+"""
+Сертификаты и открытые ключи.
+Certificate и PublicKey — компактные объекты (__slots__) вместо словарей:
+JSON проверяется один раз при разборе, а подписываемые данные (to-be-signed:
+JSON тела без поля "signature" с сортировкой ключей, в UTF-8), их SHA-256,
+отпечаток и контекст проверки вычисляются лениво и остаются в объекте.
+parse() возвращает один и тот же объект для одинакового JSON, поэтому
+повторная проверка тех же сертификатов (корневого, УЦ) не сериализует их заново.
+"""
+
+import hashlib, json, threading
+from collections import OrderedDict
+import rsa_utils as ru
+
+CACHE_SIZE = 1024  # Сертификатов в кэше разбора
+
+def _freeze(value):
+    """
+    Хэшируемый ключ содержимого. Тип входит в ключ, чтобы различать
+    значения, равные в Python, но разные в JSON (1, 1.0 и True; dict и список пар).
+    Рекурсивный обход стоит почти как json.dumps — только для нестандартных
+    сертификатов (см. _parse_key).
+    """
+    if isinstance(value, dict):
+        return (dict, tuple(sorted((k, _freeze(v)) for k, v in value.items())))
+    if isinstance(value, (list, tuple)):
+        return (list, tuple(_freeze(v) for v in value))
+    return (type(value), value)
+
+def content_key(cert):
+    """Ключ кэша: содержимое сертификата без подписи."""
+    return tuple(sorted((k, _freeze(v)) for k, v in cert.items() if k != "signature"))
+
+def canonical_bytes(cert):
+    """Каноническое кодирование без кэша."""
+    body = {k: v for k, v in cert.items() if k != "signature"}
+    return json.dumps(body, sort_keys=True).encode("utf-8")
+
+class LRUCache:
+    """Потокобезопасный LRU-словарь со счётчиками попаданий."""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._items.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._items), "maxsize": self.maxsize,
+                    "hits": self._hits, "misses": self._misses}
+
+class CanonicalForm:
+    """Подписываемые данные сертификата и производные от них значения."""
+    __slots__ = ("data", "digest", "_legacy_int", "_encoded")
+
+    def __init__(self, data):
+        self.data = data                                 # Подписываемые байты
+        self.digest = hashlib.sha256(data).digest()      # Для подписи версии 2
+        self._legacy_int = None
+        self._encoded = {}                               # n -> encode_digest(digest, n)
+
+    def legacy_int(self):
+        """Сообщение для подписи версии 1: text_to_int от JSON."""
+        if self._legacy_int is None:
+            self._legacy_int = ru.text_to_int(self.data.decode("utf-8"))
+        return self._legacy_int
+
+    def encoded(self, n):
+        """Закодированный хэш для модуля n (EMSA-PKCS1-v1_5 или усечение)."""
+        value = self._encoded.get(n)
+        if value is None:
+            # Гонка потоков безвредна: оба вычислят одно и то же значение
+            value = self._encoded[n] = ru.encode_digest(self.digest, n)
+        return value
+
+parse_cache = LRUCache()
+
+def canonical(cert):
+    """CanonicalForm сертификата (словаря): объект из кэша разбора и его форма."""
+    return parse(cert).form
+
+def tbs_bytes(cert):
+    """Подписываемые байты сертификата (словаря) для rsa_sign_bytes."""
+    return canonical(cert).data
+
+def _check_int(value, name, minimum):
+    # bool — подкласс int, но в ключе недопустим
+    if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+        raise ValueError(f"Некорректное поле {name}")
+    return value
+
+class PublicKey:
+    """Открытый ключ RSA (e, n)."""
+    __slots__ = ("e", "n", "_context")
+
+    def __init__(self, e, n):
+        self.e = _check_int(e, "e", 1)
+        self.n = _check_int(n, "n", 2)
+        self._context = None
+
+    @classmethod
+    def from_json(cls, data):
+        if not isinstance(data, dict) or "e" not in data or "n" not in data:
+            raise ValueError("Некорректный открытый ключ")
+        return cls(data["e"], data["n"])
+
+    def to_json(self):
+        return {"e": self.e, "n": self.n}
+
+    def as_tuple(self):
+        """Ключ в формате функций rsa_utils."""
+        return (self.e, self.n)
+
+    @property
+    def context(self):
+        """Контекст возведения в степень e по модулю n (rsa_utils.KeyContext)."""
+        if self._context is None:
+            self._context = ru.key_context(self.e, self.n)
+        return self._context
+
+    def __eq__(self, other):
+        return isinstance(other, PublicKey) and self.e == other.e and self.n == other.n
+
+    def __hash__(self):
+        return hash((self.e, self.n))
+
+    def __repr__(self):
+        return f"PublicKey(e={self.e}, n=<{self.n.bit_length()} бит>)"
+
+class Certificate:
+    """
+    Сертификат: subject, issuer, pubkey, signature и версия подписи.
+    Поля, которых класс не знает, сохраняются в extra и входят в подписываемые
+    данные — подпись чужого сертификата проверяется по исходному JSON.
+    """
+    __slots__ = ("version", "subject", "issuer", "pubkey", "signature", "extra",
+                 "_form", "_fingerprint")
+
+    FIELDS = ("version", "subject", "issuer", "pubkey", "signature")
+
+    def __init__(self, subject, issuer, pubkey, signature=None, version=ru.SIG_VERSION, extra=None):
+        if not isinstance(subject, str) or not isinstance(issuer, str):
+            raise ValueError("Некорректные поля subject/issuer")
+        self.subject = subject
+        self.issuer = issuer
+        self.pubkey = pubkey if isinstance(pubkey, PublicKey) else PublicKey.from_json(pubkey)
+        self.signature = None if signature is None else _check_int(signature, "signature", 0)
+        self.version = None if version is None else _check_int(version, "version", 1)  # None — старый формат без поля
+        self.extra = extra or None
+        self._form = None
+        self._fingerprint = None
+
+    @classmethod
+    def from_json(cls, data):
+        """Разбор и проверка JSON сертификата."""
+        if not isinstance(data, dict) or "subject" not in data or "issuer" not in data or "pubkey" not in data:
+            raise ValueError("Некорректный сертификат")
+        extra = {k: v for k, v in data.items() if k not in cls.FIELDS}
+        return cls(data["subject"], data["issuer"], data["pubkey"],
+                   data.get("signature"), data.get("version"), extra)
+
+    def to_json(self, with_signature=True):
+        data = dict(self.extra) if self.extra else {}
+        if self.version is not None:
+            data["version"] = self.version
+        data["subject"] = self.subject
+        data["issuer"] = self.issuer
+        data["pubkey"] = self.pubkey.to_json()
+        if with_signature and self.signature is not None:
+            data["signature"] = self.signature
+        return data
+
+    @property
+    def form(self):
+        """CanonicalForm подписываемых данных (вычисляется один раз на объект)."""
+        if self._form is None:
+            self._form = CanonicalForm(canonical_bytes(self.to_json(with_signature=False)))
+        return self._form
+
+    @property
+    def tbs_bytes(self):
+        return self.form.data
+
+    def attach_signature(self, signature):
+        """Установить подпись после вызова rsa_sign_bytes(tbs_bytes, ...)."""
+        self.signature = _check_int(signature, "signature", 0)
+        self._fingerprint = None
+
+    @property
+    def fingerprint(self):
+        """SHA-256 канонического JSON всего сертификата вместе с подписью (hex)."""
+        if self._fingerprint is None:
+            data = json.dumps(self.to_json(), sort_keys=True).encode("utf-8")
+            self._fingerprint = hashlib.sha256(data).hexdigest()
+        return self._fingerprint
+
+    def verify(self, issuer_key):
+        """
+        Проверка подписи открытым ключом издателя (PublicKey) с учётом версии:
+        версия 2 — хэш SHA-256 (rsa_verify_bytes), версия 1 — text_to_int от JSON.
+        """
+        sig = self.signature
+        if sig is None:
+            return False
+        n = issuer_key.n
+        if (self.version or 1) >= 2:
+            if sig >= n:
+                return False
+            return self.form.encoded(n) == issuer_key.context.pow(sig)
+        return self.form.legacy_int() % n == issuer_key.context.pow(sig)
+
+    def __repr__(self):
+        return f"Certificate(subject={self.subject!r}, issuer={self.issuer!r})"
+
+_FIELD_SET = frozenset(Certificate.FIELDS)
+
+def _is(value, kind, optional=False):
+    # Точное сравнение типа: True не совпадает с 1 (в JSON это разные значения)
+    return type(value) is kind or (optional and value is None)
+
+def _parse_key(data):
+    """
+    Ключ кэша разбора. Для сертификата только из известных полей — кортеж
+    значений с точной проверкой типов, без рекурсивного обхода; для
+    остальных — content_key.
+    """
+    pubkey = data.get("pubkey")
+    if data.keys() <= _FIELD_SET and type(pubkey) is dict and len(pubkey) == 2:
+        key = (data.get("version"), data.get("subject"), data.get("issuer"),
+               pubkey.get("e"), pubkey.get("n"), data.get("signature"))
+        if (_is(key[0], int, True) and _is(key[1], str) and _is(key[2], str)
+                and _is(key[3], int) and _is(key[4], int) and _is(key[5], int, True)):
+            return key
+    return (content_key(data), _freeze(data.get("signature")))
+
+def parse(data):
+    """
+    Certificate из JSON через кэш разбора: повторный разбор того же
+    сертификата (цепочка в каждом пакете) возвращает готовый объект.
+    """
+    key = _parse_key(data) if isinstance(data, dict) else None
+    cert = parse_cache.get(key) if key is not None else None
+    if cert is None:
+        cert = Certificate.from_json(data)
+        parse_cache.put(key, cert)
+    return cert
+
+def verify_signature(cert, pubkey):
+    """Проверка подписи сертификата-словаря открытым ключом-словарём {"e", "n"}."""
+    try:
+        return parse(cert).verify(PublicKey.from_json(pubkey))
+    except ValueError:
+        return False
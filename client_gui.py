@@ -6,12 +6,18 @@ GUI-клиент (Tkinter) + приём входящих сообщений (Fas
     python client_gui.py --id B1 --ca-url http://localhost:8002 --listen 9002
 """
 
-import argparse, json, threading, requests
+import argparse, asyncio, hashlib, json, queue, threading
 from pathlib import Path
 import tkinter as tk
 from tkinter import messagebox, ttk, font
 from fastapi import FastAPI, Request
 import rsa_utils as ru
+import certs
+import http_cache
+import ttl_cache
+from transport import Transport, AsyncTransport, BackgroundLoop
+import key_pool
+import hybrid
 import uvicorn
 import ctypes
 
@@ -93,6 +99,12 @@ p = argparse.ArgumentParser()
 p.add_argument("--id", required=True, help="имя клиента (A1 / B1 / ...)")
 p.add_argument("--ca-url", required=True, help="URL своего УЦ")
 p.add_argument("--listen", type=int, required=True, help="порт входящих сообщений")
+p.add_argument("--key-primes", type=int, default=2, help="простых в модуле ключа (> 2 — многопростой RSA)")
+p.add_argument("--chain-ttl", type=float, default=600, help="время жизни проверенной цепочки получателя, с")
+p.add_argument("--chain-cache-size", type=int, default=128, help="цепочек получателей в кэше")
+p.add_argument("--no-chain-persist", action="store_true", help="держать кэш цепочек получателей только в памяти")
+p.add_argument("--verify-ttl", type=float, default=300, help="время жизни результата проверки входящей цепочки, с")
+p.add_argument("--verify-cache-size", type=int, default=1024, help="проверенных входящих цепочек в кэше")
 args = p.parse_args()
 
 # Загрузка конфигурации
@@ -106,18 +118,34 @@ CLIENT_DIR.mkdir(exist_ok=True)
 KEY_FILE    = CLIENT_DIR / "key.json"
 CERT_FILE   = CLIENT_DIR / "cert.json"
 CHAIN_FILE  = CLIENT_DIR / "chain.json"   # Цепочка сертификатов [клиент, УЦ, корневой УЦ]
+REMOTE_CHAINS_FILE = CLIENT_DIR / "remote_chains.json"  # Кэш проверенных цепочек получателей
 
 # Криптографические ключи RSA
 def init_keys():
     if KEY_FILE.exists():
         return json.loads(KEY_FILE.read_text())
-    k = ru.generate_rsa_keys(bits=256)
-    key = {"d": k["private"][0], "n": k["private"][1],
-           "e": k["public"][0]}
+    k = key_pool.take(256, primes=args.key_primes)
+    key = ru.export_private_key(k)
     KEY_FILE.write_text(json.dumps(key))
     return key
 my_key = init_keys()
 
+# Исходящие запросы: общий пул соединений, тайм-ауты и повторы.
+# Сетевые действия GUI выполняются в фоновом цикле asyncio, а не в потоке Tk
+transport = Transport()
+atransport = AsyncTransport(transport)
+background = BackgroundLoop()
+
+# Кэш GET-запросов сертификатов: повторные запросы — из кэша или условные (304)
+cert_http = http_cache.HttpCache(session=transport)
+# Проверенные цепочки получателей по ID; файл кэша переживает перезапуск клиента
+# (каждая запись в кэш — запись файла с fsync; --no-chain-persist отключает файл)
+remote_chains = ttl_cache.TTLCache(maxsize=args.chain_cache_size, ttl=args.chain_ttl,
+                                   path=None if args.no_chain_persist else REMOTE_CHAINS_FILE)
+# Успешно проверенные входящие цепочки: дайджест цепочки -> True.
+# Только в памяти: результат проверки не должен переживать перезапуск
+verified_chains = ttl_cache.TTLCache(maxsize=args.verify_cache_size, ttl=args.verify_ttl)
+
 # Вспомогательные функции Tkinter
 root = tk.Tk()
 root.title(f"Client {args.id}")
@@ -220,14 +248,17 @@ chain_text.grid(row=1, column=1, padx=5, pady=5)
 
 # Кнопки для управления ключами и сертификатами
 def save_keys():
+    global my_key
     try:
         new_key = {
             "d": int(private_key_d.get()),
             "n": int(key_n.get()),
             "e": int(public_key_e.get())
         }
+        # Параметры КТО остаются действительными, только если d и n не изменились
+        if new_key["d"] == my_key["d"] and new_key["n"] == my_key["n"]:
+            new_key.update({f: my_key[f] for f in ru.CRT_FIELDS + ("other_primes",) if f in my_key})
         KEY_FILE.write_text(json.dumps(new_key))
-        global my_key
         my_key = new_key
         messagebox.showinfo("Успех", "Ключи успешно сохранены")
     except ValueError:
@@ -239,6 +270,8 @@ def save_certs():
         chain_data = json.loads(chain_text.get("1.0", tk.END))
         CERT_FILE.write_text(json.dumps(cert_data))
         CHAIN_FILE.write_text(json.dumps(chain_data))
+        # Сертификаты изменены вручную: ранее проверенные цепочки проверяются заново
+        verified_chains.invalidate()
         messagebox.showinfo("Успех", "Сертификаты успешно сохранены")
     except json.JSONDecodeError:
         messagebox.showerror("Ошибка", "Неверный формат JSON")
@@ -278,31 +311,111 @@ HoverButton(cert_btn_frame, text="Показать сертификаты", comm
 load_keys_to_gui()
 load_certs_to_gui()
 
+# Журнал: log() можно вызывать из любого потока (uvicorn, фоновый цикл).
+# Строки попадают в ограниченную очередь, а виджет обновляет только поток Tk:
+# drain_log() раз в LOG_FLUSH_MS забирает до LOG_BATCH строк и вставляет их одной операцией
+LOG_QUEUE_SIZE = 10000  # При переполнении новые строки отбрасываются и считаются
+LOG_BATCH = 500         # Строк за один проход drain_log
+LOG_FLUSH_MS = 50
+LOG_MAX_LINES = 5000    # Старые строки виджета удаляются
+
+log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+log_dropped = 0
+log_dropped_lock = threading.Lock()
+
 def log(msg: str):
-    text_log.insert(tk.END, msg + "\n")
-    text_log.see(tk.END)
+    global log_dropped
+    try:
+        log_queue.put_nowait(msg)
+    except queue.Full:
+        with log_dropped_lock:
+            log_dropped += 1
+
+def coalesce(lines):
+    """Подряд идущие одинаковые строки сворачиваются в одну с числом повторов."""
+    result = []
+    prev, count = None, 0
+    for line in lines + [None]:
+        if line == prev:
+            count += 1
+            continue
+        if prev is not None:
+            result.append(prev if count == 1 else f"{prev} (×{count})")
+        prev, count = line, 1
+    return result
+
+def drain_log():
+    global log_dropped
+    lines = []
+    try:
+        while len(lines) < LOG_BATCH:
+            lines.append(log_queue.get_nowait())
+    except queue.Empty:
+        pass
+    with log_dropped_lock:
+        dropped, log_dropped = log_dropped, 0
+    if dropped:
+        lines.append(f"... пропущено строк журнала: {dropped}")
+    if lines:
+        text_log.insert(tk.END, "\n".join(coalesce(lines)) + "\n")
+        excess = int(text_log.index("end-1c").split(".")[0]) - LOG_MAX_LINES
+        if excess > 0:
+            text_log.delete("1.0", f"{excess + 1}.0")
+        text_log.see(tk.END)
+    # Если очередь не опустела, следующий проход — сразу после обработки событий
+    root.after(1 if len(lines) >= LOG_BATCH else LOG_FLUSH_MS, drain_log)
+
+# Фоновые сетевые действия
+POLL_MS = 30  # Период проверки готовности фоновой задачи из потока Tk
+
+class UserError(Exception):
+    """Ошибка фоновой задачи, которую нужно показать пользователю."""
+    def __init__(self, title, message):
+        super().__init__(message)
+        self.title = title
+        self.message = message
+
+def run_background(coro, on_done=None):
+    """
+    Выполнить корутину в фоновом цикле. Результат и ошибки обрабатываются
+    в потоке Tk: готовность задачи проверяется через root.after.
+    Корутина не обращается к виджетам; log() безопасен из любого потока.
+    """
+    future = background.submit(coro)
+    def poll():
+        if not future.done():
+            root.after(POLL_MS, poll); return
+        try:
+            result = future.result()
+        except UserError as ex:
+            messagebox.showerror(ex.title, ex.message); return
+        except Exception as ex:
+            messagebox.showerror("Ошибка", str(ex)); return
+        if on_done is not None:
+            on_done(result)
+    root.after(POLL_MS, poll)
 
 # Процедура получения сертификата
-def request_cert():
-    csr = {"subject": args.id,
-           "pubkey": {"e": my_key["e"], "n": my_key["n"]}}
-    try:
-        cert = requests.post(f"{args.ca_url}/sign", json=csr).json()
-    except Exception as ex:
-        messagebox.showerror("Ошибка", str(ex)); return
+async def request_cert_async(csr):
+    cert = await atransport.post_json(f"{args.ca_url}/sign", csr)
     # Формирование цепочки: клиент -> УЦ -> корневой УЦ
-    ca_cert   = requests.get(f"{args.ca_url}/ca_cert").json()
-    root_cert = requests.get(f"{ROOT_URL}/ca_cert").json()
+    ca_cert, root_cert = await asyncio.gather(
+        atransport.call(cert_http.get_json, f"{args.ca_url}/ca_cert"),
+        atransport.call(cert_http.get_json, f"{ROOT_URL}/ca_cert"))
     for obj, name in [(cert, "client"), (ca_cert, "CA"), (root_cert, "root")]:
         if "signature" not in obj:
-            messagebox.showerror("Ошибка", f"{name} cert без подписи"); return
+            raise UserError("Ошибка", f"{name} cert без подписи")
     # Сохранение сертификата
     CERT_FILE.write_text(json.dumps(cert))
     CHAIN_FILE.write_text(json.dumps([cert, ca_cert, root_cert]))
-    log("Сертификат получен и сохранён")
 
-# Получение сертификата другого пользователя
-def fetch_remote_cert(remote_id: str):
+def request_cert():
+    csr = {"subject": args.id,
+           "pubkey": {"e": my_key["e"], "n": my_key["n"]}}
+    run_background(request_cert_async(csr), lambda _: log("Сертификат получен и сохранён"))
+
+# URL удостоверяющего центра другого пользователя (читает поле ввода — только из потока Tk)
+def remote_ca_url(remote_id: str):
     ca_url = entry_to.get().strip()
     if not ca_url.startswith("http"):
         # Автоматическое определение URL удостоверяющего центра по идентификатору
@@ -310,60 +423,93 @@ def fetch_remote_cert(remote_id: str):
             ca_url = f"http://{settings['CA A']['host']}:8001"
         else:
             ca_url = f"http://{settings['CA B']['host']}:8002"
-    try:
-        cert = requests.get(f"{ca_url}/cert/{remote_id}").json()
-        ca_cert   = requests.get(f"{ca_url}/ca_cert").json()
-        root_cert = requests.get(f"{ROOT_URL}/ca_cert").json()
-    except Exception as e:
-        messagebox.showerror("Ошибка", str(e)); return
-    return [cert, ca_cert, root_cert]
+    return ca_url
+
+# Получение сертификата другого пользователя (три запроса выполняются параллельно)
+async def fetch_remote_cert(remote_id: str, ca_url: str):
+    return list(await asyncio.gather(
+        atransport.call(cert_http.get_json, f"{ca_url}/cert/{remote_id}"),
+        atransport.call(cert_http.get_json, f"{ca_url}/ca_cert"),
+        atransport.call(cert_http.get_json, f"{ROOT_URL}/ca_cert")))
+
+# Проверенная цепочка получателя: из кэша или с сервера УЦ
+async def get_remote_chain(remote_id: str, ca_url: str):
+    chain = remote_chains.get(remote_id)
+    if chain is not None:
+        return chain
+    chain = await fetch_remote_cert(remote_id, ca_url)
+    is_valid, error_msg = verify_chain(chain)
+    if is_valid and chain[0].get("subject") != remote_id:
+        is_valid, error_msg = False, "Сертификат выдан другому субъекту"
+    if not is_valid:
+        raise UserError("Ошибка", f"{error_msg} {remote_id}")
+    remote_chains.put(remote_id, chain)
+    return chain
+
+def forget_remote_chain(remote_id: str, ca_url: str):
+    """Сбросить цепочку получателя в обоих кэшах (ключ получателя сменился)."""
+    remote_chains.invalidate(remote_id)
+    cert_http.invalidate(f"{ca_url}/cert/{remote_id}")
 
 # Отправка сообщения
+async def send_message_async(to_id, ca_url, m_bytes, key):
+    s_int = ru.rsa_sign_bytes(m_bytes, ru.load_private_key(key))
+    # Добавление собственной цепочки сертификатов
+    my_chain = json.loads(CHAIN_FILE.read_text())
+    url = f"http://{settings[to_id]['host']}:{settings[to_id]['listen']}/receive"
+
+    # Вторая попытка — только если получатель не смог расшифровать сообщение
+    # ключом из кэша: цепочка запрашивается заново
+    for attempt in range(2):
+        chain_remote = await get_remote_chain(to_id, ca_url)
+        remote_pub = certs.parse(chain_remote[0]).pubkey
+        # Гибридное шифрование: RSA только для сеансового ключа
+        envelope = hybrid.seal(m_bytes, remote_pub.as_tuple())
+        packet = {"from": args.id, "to": to_id, "version": ru.SIG_VERSION,
+                  "envelope": envelope, "signature": s_int,
+                  "chain": my_chain}
+
+        try:
+            reply = await atransport.post_json(url, packet, timeout=5)
+        except Exception as e:
+            raise UserError("Ошибка отправки", str(e))
+        if reply.get("ok"):
+            return f"→ {to_id}: отправлено"
+        if reply.get("code") == "key_mismatch" and attempt == 0:
+            log(f"!! {to_id}: ключ получателя изменился, повторный запрос сертификата")
+            forget_remote_chain(to_id, ca_url)
+            continue
+        return f"!! {to_id}: {reply.get('error')}"
+
 def send_message():
     to_id = entry_to.get().strip()
     if not to_id:
         messagebox.showwarning("Введите получателя", "") ; return
-    chain_remote = fetch_remote_cert(to_id)
-    if not chain_remote:
-        return
-    remote_pub = chain_remote[0]["pubkey"]
     text = text_msg.get("1.0", tk.END).strip()
     if not text:
         messagebox.showwarning("Пустое сообщение", ""); return
-    m_int = ru.text_to_int(text)
-    s_int = ru.rsa_sign(m_int, (my_key["d"], my_key["n"]))
-    c_int = ru.rsa_encrypt(m_int, (remote_pub["e"], remote_pub["n"]))
-    # Добавление собственной цепочки сертификатов
-    my_chain = json.loads(CHAIN_FILE.read_text())
-    packet = {"from": args.id, "to": to_id,
-              "cipher": c_int, "signature": s_int,
-              "chain": my_chain}
-
-    try:
-        requests.post(f"http://{settings[to_id]['host']}:{settings[to_id]['listen']}/receive", json=packet, timeout=5)
-        log(f"→ {to_id}: отправлено")
-    except Exception as e:
-        messagebox.showerror("Ошибка отправки", str(e))
+    # Значения виджетов читаются здесь, в потоке Tk; сеть и криптография — в фоне
+    run_background(send_message_async(to_id, remote_ca_url(to_id), text.encode("utf-8"), my_key), log)
 
 # Проверка цепочки сертификатов
 def verify_chain(chain):
     def verify(cert, issuer_cert):
-        body = cert.copy(); sig = body.pop("signature")
-        to_int = ru.text_to_int(json.dumps(body, sort_keys=True))
-        pub = issuer_cert["pubkey"]
-        result = ru.rsa_verify(to_int, sig, (pub["e"], pub["n"]))
-        log(f"Проверка подписи: subject={body.get('subject', 'unknown')}, "
-            f"issuer={issuer_cert.get('subject', 'unknown')}, "
+        result = cert.verify(issuer_cert.pubkey)
+        log(f"Проверка подписи: subject={cert.subject}, "
+            f"issuer={issuer_cert.subject}, "
             f"результат={result}")
         return result
 
     # Проверка цепочки: клиент -> УЦ -> корневой УЦ
-    client, ca, root = chain
+    try:
+        client, ca, root = (certs.parse(cert) for cert in chain)
+    except (ValueError, TypeError):
+        return False, "Некорректная цепочка сертификатов"
     
     log("=== Начало проверки цепочки сертификатов ===")
-    log(f"Клиент: {client.get('subject', 'unknown')}")
-    log(f"УЦ: {ca.get('subject', 'unknown')}")
-    log(f"Корневой УЦ: {root.get('subject', 'unknown')}")
+    log(f"Клиент: {client.subject}")
+    log(f"УЦ: {ca.subject}")
+    log(f"Корневой УЦ: {root.subject}")
     
     # Проверка сертификата клиента
     if not verify(client, ca):
@@ -374,9 +520,7 @@ def verify_chain(chain):
         return False, "Недействительный сертификат УЦ отправителя"
     
     # Проверка самоподписанного корневого сертификата
-    root_body = root.copy(); sig = root_body.pop("signature")
-    to_int = ru.text_to_int(json.dumps(root_body, sort_keys=True))
-    root_result = ru.rsa_verify(to_int, sig, (root["pubkey"]["e"], root["pubkey"]["n"]))
+    root_result = root.verify(root.pubkey)
     log(f"Проверка корневого сертификата: результат={root_result}")
     
     if not root_result:
@@ -385,16 +529,41 @@ def verify_chain(chain):
     log("=== Проверка цепочки сертификатов успешно завершена ===")
     return True, None
 
+def chain_digest(chain):
+    return hashlib.sha256(json.dumps(chain, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Проверка входящей цепочки с запоминанием успешного результата.
+# Отзыва сертификатов в УЦ нет: проверенная цепочка принимается до истечения --verify-ttl
+def verify_chain_cached(chain):
+    try:
+        key = chain_digest(chain)
+    except (TypeError, ValueError):
+        return False, "Некорректная цепочка сертификатов"
+    if verified_chains.get(key) is not None:
+        log(f"Цепочка {chain[0].get('subject', 'unknown')} проверена ранее")
+        return True, None
+    is_valid, error_msg = verify_chain(chain)
+    if is_valid:
+        verified_chains.put(key, True)
+    return is_valid, error_msg
+
 # Обработчик входящих сообщений FastAPI
 api = FastAPI()
 @api.post("/receive")
 async def receive(req: Request):
     data = await req.json()
-    cipher = int(data["cipher"]); signature = int(data["signature"])
+    signature = int(data["signature"])
     chain  = data["chain"]
+    # Поле version не подписано. Конверты появились вместе с подписью хэша (версия 2),
+    # поэтому для них «textbook»-проверка версии 1 недопустима: её подделывает любой,
+    # кто знает открытый ключ отправителя (s произвольное, m = s^e mod n)
+    version = data.get("version", 1)
+    if not isinstance(version, int) or isinstance(version, bool) or ("envelope" in data and version < 2):
+        log(f"!! Некорректная версия пакета от {data.get('from')}")
+        return {"ok": False, "error": f"Некорректная версия пакета {data.get('from')}"}
     
-    # Проверка цепочки сертификатов с детальными ошибками
-    is_valid, error_msg = verify_chain(chain)
+    # Проверка цепочки сертификатов с детальными ошибками (повторная — из кэша)
+    is_valid, error_msg = verify_chain_cached(chain)
     if not is_valid:
         log(f"!! {error_msg}"); 
         if not "корневого" in error_msg:
@@ -403,14 +572,28 @@ async def receive(req: Request):
             error_msg = error_msg 
         return {"ok": False, "error": error_msg}
         
-    sender_pub = chain[0]["pubkey"]
-    m_int = ru.rsa_decrypt(cipher, (my_key["d"], my_key["n"]))
-    if not ru.rsa_verify(m_int, signature, (sender_pub["e"], sender_pub["n"])):
+    sender_pub = certs.parse(chain[0]).pubkey.as_tuple()  # Уже разобран в verify_chain
+    privkey = ru.load_private_key(my_key)
+    if "envelope" in data:
+        try:
+            m_bytes = hybrid.open_envelope(data["envelope"], privkey)
+        except ValueError as ex:
+            # Повреждённый конверт или сеансовый ключ зашифрован не нашим ключом (устаревший сертификат у отправителя)
+            log(f"!! {ex}")
+            return {"ok": False, "error": f"{ex} {data['from']}", "code": "key_mismatch"}
+    else:
+        # Старый формат: всё сообщение зашифровано одним числом
+        m_bytes = ru.int_to_bytes(ru.rsa_decrypt(int(data["cipher"]), privkey))
+    if version >= 2:
+        valid = ru.rsa_verify_bytes(m_bytes, signature, sender_pub)
+    else:
+        valid = ru.rsa_verify(int.from_bytes(m_bytes, 'big'), signature, sender_pub)
+    if not valid:
         error_msg = "Подпись недействительна"
         log(f"!! {error_msg}"); 
         return {"ok": False, "error": error_msg + " " + data['from']}
         
-    text = ru.int_to_text(m_int)
+    text = m_bytes.decode("utf-8", errors="ignore")
     log(f"← {data['from']}: {text}")
     return {"ok": True}
 
@@ -498,4 +681,5 @@ messagebox.showerror = show_error
 messagebox.showwarning = show_warning
 
 log(f"Клиент {args.id} запущен, слушаю порт {args.listen}")
+root.after(LOG_FLUSH_MS, drain_log)
 root.mainloop()
@@ -0,0 +1,96 @@
+"""
+HTTP-кэширование сертификатов.
+Сервер (root_ca, ca_node): cert_response() отдаёт сертификат с сильным
+ETag (отпечаток сертификата) и Cache-Control: max-age, а на запрос
+с совпадающим If-None-Match отвечает 304 без тела.
+Клиент: HttpCache.get_json() не обращается к серверу, пока ответ свежий
+(max-age), а после — перепроверяет его условным запросом с If-None-Match.
+"""
+
+import re, threading, time
+from fastapi.responses import JSONResponse, Response
+import transport
+
+CA_CERT_MAX_AGE = 3600     # Сертификаты УЦ меняются крайне редко, с
+CLIENT_CERT_MAX_AGE = 300  # Сертификаты клиентов, с
+
+def etag_for(fingerprint):
+    return f'"{fingerprint}"'
+
+def etag_matches(if_none_match, etag):
+    """Совпадает ли ETag с одним из значений заголовка If-None-Match."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+def cert_response(request, cert, max_age):
+    """Ответ с сертификатом (certs.Certificate) или 304, если он не изменился."""
+    etag = etag_for(cert.fingerprint)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(cert.to_json(), headers=headers)
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+def _freshness(headers):
+    """Срок свежести ответа по Cache-Control, с (0 — каждый раз перепроверять)."""
+    cache_control = headers.get("Cache-Control", "")
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        return 0
+    match = _MAX_AGE.search(cache_control)
+    return int(match.group(1)) if match else 0
+
+class HttpCache:
+    """Клиентский кэш JSON-ответов GET по URL с ETag и max-age."""
+
+    def __init__(self, session=None):
+        self.session = session or transport.default_transport  # Нужен только метод get()
+        self._entries = {}  # url -> (etag, expires, body)
+        self._lock = threading.Lock()
+        self.hits = 0           # Ответ взят из кэша без запроса
+        self.revalidated = 0    # Сервер ответил 304
+        self.fetched = 0        # Сервер прислал тело
+
+    def get_json(self, url, timeout=None):
+        with self._lock:
+            entry = self._entries.get(url)
+        now = time.monotonic()
+        if entry is not None and now < entry[1]:
+            with self._lock:
+                self.hits += 1
+            return entry[2]
+
+        headers = {"If-None-Match": entry[0]} if entry is not None and entry[0] else {}
+        resp = self.session.get(url, headers=headers, timeout=timeout)
+        if resp.status_code == 304 and entry is not None:
+            with self._lock:
+                self._entries[url] = (entry[0], now + _freshness(resp.headers), entry[2])
+                self.revalidated += 1
+            return entry[2]
+
+        body = resp.json()
+        with self._lock:
+            self.fetched += 1
+            if resp.status_code == 200 and "no-store" not in resp.headers.get("Cache-Control", ""):
+                self._entries[url] = (resp.headers.get("ETag"), now + _freshness(resp.headers), body)
+            else:
+                self._entries.pop(url, None)
+        return body
+
+    def invalidate(self, url=None):
+        """Забыть ответ для url (или все ответы)."""
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(url, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits,
+                    "revalidated": self.revalidated, "fetched": self.fetched}
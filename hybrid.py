@@ -0,0 +1,144 @@
+"""
+Гибридное шифрование сообщений.
+RSA шифрует только случайный сеансовый ключ, а тело сообщения шифруется
+по блокам потоковым шифром, поэтому длина сообщения не ограничена модулем n.
+
+Потоковый слой: гамма SHAKE-256(ключ || nonce || номер блока), наложенная XOR
+на блок открытого текста; целостность — HMAC-SHA256 по заголовку и всем
+шифроблокам (encrypt-then-MAC).
+
+Конверт в JSON:
+    {"v": 1, "ek": int, "nonce": hex, "chunks": [base64, ...], "tag": hex}
+"""
+
+import base64, hashlib, hmac, os
+import rsa_utils as ru
+
+ENVELOPE_VERSION = 1
+CHUNK_SIZE = 64 * 1024  # Размер блока открытого текста, байт
+NONCE_SIZE = 16
+
+def session_key_length(n):
+    """Длина сеансового ключа в байтах: до 32, но строго меньше модуля."""
+    return min(32, (n.bit_length() - 1) // 8)
+
+def _derive_keys(session_key):
+    """Раздельные ключи для шифрования и для HMAC."""
+    return (hashlib.sha256(b"enc" + session_key).digest(),
+            hashlib.sha256(b"mac" + session_key).digest())
+
+class StreamCipher:
+    """Потоковый шифр: блок i шифруется гаммой SHAKE-256(key || nonce || i)."""
+
+    def __init__(self, key, nonce):
+        self.key = key
+        self.nonce = nonce
+        self.index = 0
+
+    def process(self, chunk):
+        """Зашифровать или расшифровать очередной блок (операция симметрична)."""
+        if not chunk:
+            return b""
+        gamma = hashlib.shake_256(self.key + self.nonce + self.index.to_bytes(8, 'big')).digest(len(chunk))
+        self.index += 1
+        return (int.from_bytes(chunk, 'big') ^ int.from_bytes(gamma, 'big')).to_bytes(len(chunk), 'big')
+
+def _new_mac(mac_key, ek, nonce):
+    mac = hmac.new(mac_key, digestmod=hashlib.sha256)
+    mac.update(ru.int_to_bytes(ek) + nonce)
+    return mac
+
+def _mac_chunk(mac, index, chunk):
+    mac.update(index.to_bytes(8, 'big') + len(chunk).to_bytes(8, 'big') + chunk)
+
+def split_chunks(data, size=CHUNK_SIZE):
+    """Разбиение байтовой строки на блоки без копирования всего сообщения."""
+    view = memoryview(data)
+    for i in range(0, len(data), size):
+        yield bytes(view[i:i + size])
+
+def encrypt_chunks(chunks, pubkey):
+    """
+    Генератор конверта для потока блоков открытого текста.
+    Первым элементом выдаёт заголовок {"v", "ek", "nonce"}, затем зашифрованные
+    блоки (bytes), последним — тег целостности (hex-строка).
+    """
+    e, n = pubkey
+    session_key = os.urandom(session_key_length(n))
+    nonce = os.urandom(NONCE_SIZE)
+    ek = ru.rsa_encrypt(int.from_bytes(session_key, 'big'), pubkey)
+    enc_key, mac_key = _derive_keys(session_key)
+    cipher = StreamCipher(enc_key, nonce)
+    mac = _new_mac(mac_key, ek, nonce)
+    yield {"v": ENVELOPE_VERSION, "ek": ek, "nonce": nonce.hex()}
+    count = 0
+    for chunk in chunks:
+        block = cipher.process(chunk)
+        _mac_chunk(mac, count, block)
+        count += 1
+        yield block
+    mac.update(count.to_bytes(8, 'big'))
+    yield mac.hexdigest()
+
+def decrypt_chunks(header, cipher_chunks, tag, privkey):
+    """
+    Генератор блоков открытого текста.
+    cipher_chunks должен допускать повторный обход: сначала проверяется тег
+    по всем шифроблокам, и только затем выдаётся открытый текст.
+    """
+    if header.get("v") != ENVELOPE_VERSION:
+        raise ValueError("Неподдерживаемая версия конверта")
+    n = privkey[1]
+    nonce = bytes.fromhex(header["nonce"])
+    key_int = ru.rsa_decrypt(header["ek"], privkey)
+    if key_int.bit_length() > 8 * session_key_length(n):
+        raise ValueError("Сеансовый ключ зашифрован другим ключом")
+    session_key = key_int.to_bytes(session_key_length(n), 'big')
+    enc_key, mac_key = _derive_keys(session_key)
+    mac = _new_mac(mac_key, header["ek"], nonce)
+    count = 0
+    for block in cipher_chunks:
+        _mac_chunk(mac, count, block)
+        count += 1
+    mac.update(count.to_bytes(8, 'big'))
+    if not hmac.compare_digest(mac.hexdigest(), tag):
+        raise ValueError("Нарушена целостность сообщения")
+    cipher = StreamCipher(enc_key, nonce)
+    for block in cipher_chunks:
+        yield cipher.process(block)
+
+def seal(data, pubkey):
+    """Зашифровать байты в JSON-конверт."""
+    parts = encrypt_chunks(split_chunks(data), pubkey)
+    envelope = next(parts)
+    envelope["chunks"] = []
+    for part in parts:
+        if isinstance(part, str):
+            envelope["tag"] = part
+        else:
+            envelope["chunks"].append(base64.b64encode(part).decode("ascii"))
+    return envelope
+
+def _check_envelope(envelope, n):
+    """Проверка полей конверта из сети; ValueError вместо KeyError/TypeError."""
+    if not isinstance(envelope, dict):
+        raise ValueError("Некорректный конверт")
+    ek, nonce, chunks, tag = (envelope.get(k) for k in ("ek", "nonce", "chunks", "tag"))
+    if not isinstance(ek, int) or isinstance(ek, bool) or not 0 <= ek < n:
+        raise ValueError("Некорректное поле ek")
+    if not isinstance(nonce, str) or len(nonce) != 2 * NONCE_SIZE:
+        raise ValueError("Некорректное поле nonce")
+    if not isinstance(chunks, list) or not all(isinstance(chunk, str) for chunk in chunks):
+        raise ValueError("Некорректное поле chunks")
+    if not isinstance(tag, str) or len(tag) != 2 * hashlib.sha256().digest_size or not tag.isascii():
+        raise ValueError("Некорректное поле tag")
+
+def open_envelope(envelope, privkey):
+    """
+    Расшифровать JSON-конверт в байты. Весь конверт уже в памяти (JSON
+    запроса), поэтому открытый текст собирается целиком; потоковая
+    обработка — decrypt_chunks. Ошибки формата и целостности — ValueError.
+    """
+    _check_envelope(envelope, privkey[1])
+    blocks = [base64.b64decode(chunk, validate=True) for chunk in envelope["chunks"]]
+    return b"".join(decrypt_chunks(envelope, blocks, envelope["tag"], privkey))
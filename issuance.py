@@ -0,0 +1,141 @@
+"""
+Координация выдачи сертификатов в УЦ.
+Перед подписью субъект резервируется: проверка «уже выдан или уже выдаётся»
+и резервирование выполняются под блокировкой полосы (stripe), в которую
+попадает субъект. Поэтому из двух одновременных запросов одного субъекта
+ровно один проходит к подписи, а второй сразу получает отказ, а запросы
+разных субъектов почти не ждут друг друга.
+Если хранилище само умеет резервировать (SqliteCertStore.reserve_many/release_many),
+резерв дополнительно берётся в нём, и уникальность соблюдается между процессами;
+партия субъектов резервируется и освобождается одной транзакцией хранилища.
+Использование:
+    if not issuer.reserve(subject):
+        ...  # Отказ: сертификат уже выдан или выдаётся
+    try:
+        ...  # Подпись и store.add(subject, cert)
+    finally:
+        issuer.release(subject)
+"""
+
+import os, threading, zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+def atomic_write_text(path, text):
+    """
+    Замена файла без риска оставить его недописанным: запись во временный
+    файл, fsync и os.replace; после переименования сбрасывается и каталог.
+    """
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if hasattr(os, "O_DIRECTORY"):  # На Windows каталог открыть нельзя
+        fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def atomic_create_text(path, text):
+    """
+    Создать файл, только если его ещё нет: запись во временный файл и
+    os.link на целевое имя. Из нескольких процессов, одновременно создающих
+    один файл, успешен ровно один. False — файл уже существовал.
+    """
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.link(tmp, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        tmp.unlink()
+
+class IssuanceCoordinator:
+    def __init__(self, store, stripes=64):
+        self.store = store  # Любой объект с оператором in (CertStore, SqliteCertStore)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._reserved = set()
+        self._stats_lock = threading.Lock()
+        self._granted = 0
+        self._rejected = 0
+
+    def _stripe(self, subject):
+        # crc32, а не hash(): номер полосы не зависит от PYTHONHASHSEED
+        return zlib.crc32(subject.encode("utf-8")) % len(self._locks)
+
+    @contextmanager
+    def _locked(self, subjects):
+        """Блокировки полос всех субъектов; берутся по возрастанию номера — без взаимоблокировок."""
+        stripes = sorted({self._stripe(subject) for subject in subjects})
+        for i in stripes:
+            self._locks[i].acquire()
+        try:
+            yield
+        finally:
+            for i in reversed(stripes):
+                self._locks[i].release()
+
+    def reserve_many(self, subjects):
+        """
+        Зарезервировать субъекты для выдачи. Возвращает список bool:
+        False — сертификат уже выдан, выдаётся другим запросом или субъект
+        повторяется в списке. При исключении не резервируется ни один субъект.
+        """
+        subjects = list(subjects)
+        results = []
+        with self._locked(subjects):
+            seen = set()
+            for subject in subjects:
+                results.append(subject not in seen and subject not in self._reserved
+                               and subject not in self.store)
+                seen.add(subject)
+            if hasattr(self.store, "reserve_many"):
+                idxs = [i for i, ok in enumerate(results) if ok]
+                for i, ok in zip(idxs, self.store.reserve_many([subjects[i] for i in idxs])):
+                    results[i] = ok
+            self._reserved.update(subject for subject, ok in zip(subjects, results) if ok)
+        granted = sum(results)
+        with self._stats_lock:
+            self._granted += granted
+            self._rejected += len(results) - granted
+        return results
+
+    def reserve(self, subject):
+        """
+        Зарезервировать субъект для выдачи.
+        False — сертификат уже выдан или выдаётся другим запросом.
+        """
+        return self.reserve_many([subject])[0]
+
+    def release_many(self, subjects):
+        """
+        Снять резервы. Вызывается после записи сертификатов в хранилище
+        (или после ошибки подписи — тогда субъекты можно запросить снова).
+        """
+        subjects = list(subjects)
+        with self._locked(subjects):
+            mine = [subject for subject in subjects if subject in self._reserved]
+            if mine and hasattr(self.store, "release_many"):
+                self.store.release_many(mine)
+            self._reserved.difference_update(subjects)
+
+    def release(self, subject):
+        self.release_many([subject])
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "in_flight": len(self._reserved),
+                "granted": self._granted,
+                "rejected": self._rejected,
+            }
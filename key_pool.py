@@ -0,0 +1,170 @@
+"""
+Пул заранее сгенерированных ключевых пар RSA.
+Ключи лежат в каталоге key_pool/<bits>/ (key_pool/<bits>x<primes>/ для
+многопростых ключей) по одному файлу на пару,
+поэтому пул общий для всех УЦ и клиентов, запущенных из этого каталога.
+Запуск демона пополнения:
+    python key_pool.py --bits 256 --depth 8
+Использование в коде:
+    k = key_pool.take(256)   # готовая пара за O(1), пул пополняется в фоне
+    k = key_pool.take(256, primes=3)
+"""
+
+import argparse, json, os, threading, time, uuid
+from pathlib import Path
+import rsa_utils as ru
+
+POOL_DIR = Path(__file__).parent / "key_pool"
+
+class KeyPool:
+    """
+    Ограниченный резерв ключевых пар для заданных размеров ключа.
+    Размер — число bits (как в generate_rsa_keys) или пара (bits, primes).
+    take() забирает готовую пару, а недостающие пары догенерирует фоновый поток.
+    """
+
+    def __init__(self, directory=POOL_DIR, sizes=(256,), depth=4, workers=None):
+        self.directory = Path(directory)
+        self.sizes = tuple(self._size(size) for size in sizes)
+        self.target_depth = depth      # Сколько пар держать для каждого размера
+        self.workers = workers         # Передаётся в generate_rsa_keys
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._generated = 0
+        self._gen_seconds = 0.0
+        self._taken = 0
+        self._misses = 0
+
+    @staticmethod
+    def _size(size):
+        """Нормализация размера к паре (bits, primes)."""
+        return (size, 2) if isinstance(size, int) else tuple(size)
+
+    def _dir(self, size):
+        bits, primes = self._size(size)
+        d = self.directory / (str(bits) if primes == 2 else f"{bits}x{primes}")
+        d.mkdir(parents=True, exist_ok=True)
+        return d
+
+    def depth(self, size):
+        """Количество готовых пар заданного размера."""
+        return sum(1 for _ in self._dir(size).glob("*.json"))
+
+    def _claim(self, size):
+        """
+        Атомарно забрать одну пару из каталога.
+        Переименование удаётся только одному процессу, поэтому
+        одна и та же пара не достанется двум владельцам.
+        """
+        for path in self._dir(size).glob("*.json"):
+            claimed = path.with_name(f"{path.name}.taken-{uuid.uuid4().hex}")
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue  # Пару уже забрал другой процесс
+            try:
+                data = json.loads(claimed.read_text())
+            finally:
+                claimed.unlink()
+            # Файлы старого формата содержат только p и q
+            primes = data["primes"] if "primes" in data else (data["p"], data["q"])
+            return ru.rsa_keys_from_primes(*primes)
+        return None
+
+    def put(self, size, keys):
+        """Положить пару в пул (запись во временный файл и переименование)."""
+        d = self._dir(size)
+        name = uuid.uuid4().hex
+        tmp = d / f"{name}.tmp"
+        tmp.write_text(json.dumps({"primes": keys["primes"]}))
+        os.replace(tmp, d / f"{name}.json")
+
+    def take(self, bits, primes=2):
+        """
+        Получить ключевую пару в формате generate_rsa_keys().
+        Если пул пуст, пара генерируется сразу; в обоих случаях
+        запускается фоновое пополнение.
+        """
+        size = (bits, primes)
+        keys = self._claim(size)
+        with self._lock:
+            self._taken += 1
+            if keys is None:
+                self._misses += 1
+            if size not in self.sizes:
+                self.sizes += (size,)
+        if keys is None:
+            keys = ru.generate_rsa_keys(bits=bits, workers=self.workers, primes=primes)
+        self.refill_async()
+        return keys
+
+    def refill(self):
+        """Догенерировать пары до target_depth для всех размеров."""
+        while not self._stop.is_set():
+            # Список размеров перечитывается: take() мог добавить новый
+            short = [size for size in self.sizes if self.depth(size) < self.target_depth]
+            if not short:
+                return
+            bits, primes = short[0]
+            started = time.perf_counter()
+            keys = ru.generate_rsa_keys(bits=bits, workers=self.workers, primes=primes)
+            self.put((bits, primes), keys)
+            with self._lock:
+                self._generated += 1
+                self._gen_seconds += time.perf_counter() - started
+
+    def refill_async(self):
+        """Запустить однократное пополнение в фоновом потоке, если оно ещё не идёт."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self.refill, daemon=True)
+            self._thread.start()
+
+    def run(self, interval=1.0):
+        """Режим демона: поддерживать пул заполненным до вызова stop()."""
+        while not self._stop.is_set():
+            self.refill()
+            self._stop.wait(interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        """Глубина пула по размерам и статистика пополнения."""
+        with self._lock:
+            rate = self._generated / self._gen_seconds if self._gen_seconds else 0.0
+            return {
+                "depth": {self._dir(size).name: self.depth(size) for size in self.sizes},
+                "target_depth": self.target_depth,
+                "generated": self._generated,
+                "taken": self._taken,
+                "misses": self._misses,
+                "refill_rate": rate,  # Пар в секунду
+            }
+
+default_pool = KeyPool()
+
+def take(bits, primes=2):
+    """Получить ключевую пару из общего пула (см. KeyPool.take)."""
+    return default_pool.take(bits, primes)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bits", type=int, nargs="+", default=[256], help="размеры ключей")
+    parser.add_argument("--depth", type=int, default=8, help="сколько пар держать для каждого размера")
+    parser.add_argument("--primes", type=int, default=2, help="простых в модуле (многопростой RSA)")
+    parser.add_argument("--workers", type=int, default=None, help="процессов на одну генерацию")
+    parser.add_argument("--interval", type=float, default=1.0, help="период проверки пула, с")
+    args = parser.parse_args()
+
+    pool = KeyPool(sizes=[(bits, args.primes) for bits in args.bits],
+                   depth=args.depth, workers=args.workers)
+    threading.Thread(target=pool.run, args=(args.interval,), daemon=True).start()
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(pool.stats()))
+    except KeyboardInterrupt:
+        pool.stop()
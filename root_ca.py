@@ -9,61 +9,100 @@
 
 import json, threading
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 
 import rsa_utils as ru
+import certs
+import http_cache
+import key_pool
+from signing_executor import SigningExecutor
+from issuance import atomic_write_text
 
 ROOT_DIR = Path(__file__).parent
 KEY_FILE = ROOT_DIR / "root_key.json"
 CERT_FILE = ROOT_DIR / "root_cert.json"
 
+KEY_PRIMES = 2  # Количество простых в модуле корневого ключа (> 2 — многопростой RSA)
+SIGN_WORKERS = None  # Процессов для подписи (None — по числу ядер)
+SIGN_QUEUE = 64      # Максимум запросов на подпись в работе и в очереди
+
 app = FastAPI(title="Root CA")
 
 # ---------- инициализация ----------
 def init_root():
     if KEY_FILE.exists() and CERT_FILE.exists():
         priv = json.loads(KEY_FILE.read_text())
-        cert = json.loads(CERT_FILE.read_text())
+        cert = certs.Certificate.from_json(json.loads(CERT_FILE.read_text()))
         return priv, cert
 
-    k = ru.generate_rsa_keys(bits=256)  # Тестовый размер ключа, для продакшена использовать 2048+ бит
-    priv = {"d": k["private"][0], "n": k["private"][1]}
-    pub  = {"e": k["public"][0],  "n": k["public"][1]}
+    k = key_pool.take(256, primes=KEY_PRIMES)  # Тестовый размер ключа, для продакшена использовать 2048+ бит
+    priv = ru.export_private_key(k)
+    pub  = certs.PublicKey(*k["public"])
 
-    cert_body = {
-        "subject": "Root CA",
-        "issuer": "Root CA",
-        "pubkey": pub,
-    }
-    to_sign = ru.text_to_int(json.dumps(cert_body, sort_keys=True))
-    cert_body["signature"] = ru.rsa_sign(to_sign, (priv["d"], priv["n"]))
+    cert = certs.Certificate("Root CA", "Root CA", pub)
+    cert.attach_signature(ru.rsa_sign_bytes(cert.tbs_bytes, ru.load_private_key(priv)))
 
-    KEY_FILE.write_text(json.dumps(priv))
-    CERT_FILE.write_text(json.dumps(cert_body))
-    return priv, cert_body
+    atomic_write_text(KEY_FILE, json.dumps(priv))
+    atomic_write_text(CERT_FILE, json.dumps(cert.to_json()))
+    return priv, cert
 
 root_priv, root_cert = init_root()
+root_privkey = ru.load_private_key(root_priv)
+signer = SigningExecutor(workers=SIGN_WORKERS, max_queue=SIGN_QUEUE)
 
 # ---------- модели ----------
 class CSR(BaseModel):
     subject: str
     pubkey: dict  # Открытый ключ в формате {"e": int, "n": int}
 
+class CSRBatch(BaseModel):
+    csrs: list[CSR]
+
+def make_cert(csr):
+    """Неподписанный сертификат по запросу; ValueError при некорректном ключе."""
+    return certs.Certificate(csr.subject, "Root CA", csr.pubkey)
+
 # ---------- роуты ----------
 @app.get("/ca_cert")
-async def get_ca_cert():
-    return root_cert
+async def get_ca_cert(request: Request):
+    return http_cache.cert_response(request, root_cert, http_cache.CA_CERT_MAX_AGE)
 
 @app.post("/sign")
 async def sign_intermediate(csr: CSR):
     if csr.subject.startswith("Root"):
         raise HTTPException(400, "Root CA не подписывает сам себя")
-    cert_body = {
-        "subject": csr.subject,
-        "issuer": "Root CA",
-        "pubkey": csr.pubkey,
-    }
-    to_sign = ru.text_to_int(json.dumps(cert_body, sort_keys=True))
-    cert_body["signature"] = ru.rsa_sign(to_sign, (root_priv["d"], root_priv["n"]))
-    return cert_body
+    try:
+        cert = make_cert(csr)
+    except ValueError as ex:
+        raise HTTPException(400, str(ex))
+    with signer.overload_as_503():
+        cert.attach_signature(await signer.sign(cert.tbs_bytes, root_privkey))
+    return cert.to_json()
+
+@app.post("/sign_batch")
+async def sign_intermediate_batch(batch: CSRBatch):
+    """Подпись сертификатов промежуточных УЦ по списку запросов (параллельно в пуле процессов)."""
+    results = [None] * len(batch.csrs)
+    pending = []  # (индекс, сертификат)
+    for i, csr in enumerate(batch.csrs):
+        if csr.subject.startswith("Root"):
+            results[i] = {"ok": False, "error": "Root CA не подписывает сам себя"}
+            continue
+        try:
+            pending.append((i, make_cert(csr)))
+        except ValueError as ex:
+            results[i] = {"ok": False, "error": str(ex)}
+
+    to_sign = [cert.tbs_bytes for _, cert in pending]
+    with signer.overload_as_503():
+        signatures = await signer.sign_many(to_sign, root_privkey)
+
+    for (i, cert), signature in zip(pending, signatures):
+        cert.attach_signature(signature)
+        results[i] = {"ok": True, "cert": cert.to_json()}
+    return {"results": results}
+
+@app.get("/stats")
+async def get_stats():
+    return {"signing": signer.stats()}
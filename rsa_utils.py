@@ -1,4 +1,9 @@
+import hashlib
+import os
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from functools import lru_cache
 
 # Параметры генератора линейной конгруэнтности для 31-битной реализации
 # Параметры взяты из библиотеки "Numerical Recipes" для оптимальной генерации случайных чисел
@@ -9,50 +14,120 @@ m = 2**31 - 1  # Число Мерсенна 2^31-1 = 2147483647
 # Инициализация начального значения на основе системного времени
 seed = int(time.time() * 1000) % m
 
-def set_seed(s):
-    """Установить начальное значение генератора."""
-    global seed
-    seed = s % m
-
 def my_random():
-    """Возвращает следующее псевдослучайное число."""
+    """Возвращает следующее псевдослучайное число (учебный ЛКГ, в генерации ключей не используется)."""
     global seed
     seed = (a * seed + c) % m
     return seed
 
-def my_getrandbits(n):
+# ---------- Источники случайных байт ----------
+class RandomSource:
     """
-    Возвращает целое число, полученное путем генерации n случайных бит.
-    Для генерации используется несколько вызовов my_random().
-    """
-    result = 0
-    bits_per_call = 31  # Количество бит, генерируемых за один вызов my_random()
-    calls = (n + bits_per_call - 1) // bits_per_call
-    for _ in range(calls):
-        # Сдвиг накопленных бит влево на 31 позицию
-        # Добавление новых случайных бит через побитовое ИЛИ
-        result = (result << bits_per_call) | my_random()
-    # Обрезка избыточных бит до требуемой длины
-    mask = (1 << n) - 1  # Битовая маска длины n
-    result = result & mask
-    return result
+    Источник случайных байт с внутренним буфером.
+    Наследники реализуют _generate(n) — выдачу n новых байт за один вызов.
+    """
+    chunk = 4096  # Минимальный объём пополнения буфера, байт
+
+    def __init__(self):
+        self._buf = b""
+        self._pos = 0
+        self._lock = threading.Lock()
+
+    def _generate(self, n):
+        raise NotImplementedError
+
+    def fill(self, n):
+        """Возвращает n случайных байт."""
+        with self._lock:
+            avail = len(self._buf) - self._pos
+            if n > avail:
+                self._buf = self._buf[self._pos:] + self._generate(max(n - avail, self.chunk))
+                self._pos = 0
+            out = self._buf[self._pos:self._pos + n]
+            self._pos += n
+            return out
+
+    def getrandbits(self, n):
+        """Возвращает целое число из n случайных бит."""
+        if n <= 0:
+            return 0
+        nbytes = (n + 7) // 8
+        return int.from_bytes(self.fill(nbytes), 'big') >> (nbytes * 8 - n)
+
+class OsRandomSource(RandomSource):
+    """Энтропия операционной системы (os.urandom)."""
+
+    def __init__(self):
+        super().__init__()
+        self._pid = os.getpid()
+
+    def fill(self, n):
+        if self._pid != os.getpid():
+            # После fork буфер общий с родителем — сбрасываем его
+            with self._lock:
+                self._buf, self._pos, self._pid = b"", 0, os.getpid()
+        return super().fill(n)
+
+    def _generate(self, n):
+        return os.urandom(n)
+
+class DeterministicRandomSource(RandomSource):
+    """
+    Воспроизводимый поток байт из начального значения seed:
+    SHAKE-256 от (seed, номер блока). Для тестов и повторяемых замеров.
+    """
+
+    def __init__(self, seed_value):
+        super().__init__()
+        self._key = hashlib.sha256(str(seed_value).encode()).digest()
+        self._counter = 0
+
+    def _generate(self, n):
+        block = hashlib.shake_256(self._key + self._counter.to_bytes(8, 'big')).digest(n)
+        self._counter += 1
+        return block
+
+# Источник по умолчанию — энтропия ОС
+_source = OsRandomSource()
+
+def set_random_source(source):
+    """Заменить источник случайных байт для генерации ключей и тестов простоты."""
+    global _source
+    _source = source
+
+def get_random_source():
+    return _source
+
+def set_seed(s):
+    """
+    Установить начальное значение генератора.
+    Переключает генерацию на детерминированный источник DeterministicRandomSource(s).
+    """
+    global seed
+    seed = s % m
+    set_random_source(DeterministicRandomSource(s))
+
+def my_getrandbits(n):
+    """Возвращает целое число, полученное путем генерации n случайных бит."""
+    return _source.getrandbits(n)
 
 def my_randint(a, b):
     """
     Возвращает случайное целое число из диапазона [a, b] включительно.
     Для равномерного распределения используется метод отбора (rejection sampling).
     """
-    import math
     rng = b - a + 1
-    bits = math.ceil(math.log2(rng))
+    bits = (rng - 1).bit_length()
     while True:
         r = my_getrandbits(bits)
         if r < rng:
             return a + r
 
-def my_pow(a, b, mod):
+# ---------- Модульное возведение в степень ----------
+def pow_reference(a, b, mod):
     """
-    Вычисляет (a^b) mod с помощью алгоритма быстрого возведения в степень.
+    Вычисляет (a^b) mod с помощью алгоритма быстрого возведения в степень
+    (бинарный метод «справа налево», учебная реализация).
     """
     result = 1
     a = a % mod
@@ -63,6 +138,189 @@ def my_pow(a, b, mod):
         b //= 2
     return result
 
+def window_size(nbits):
+    """Размер окна в зависимости от длины показателя."""
+    return 1 if nbits <= 8 else 3 if nbits <= 64 else 4 if nbits <= 256 else 5 if nbits <= 1024 else 6
+
+def exponent_plan(b, k):
+    """
+    Разбиение показателя b > 0 на скользящие окна шириной не более k «слева направо».
+    Возвращает список шагов (squarings, index): выполнить squarings возведений
+    в квадрат, затем умножить на a^(2*index + 1) (index = None — только квадраты).
+    Первый шаг задаёт начальное значение, его squarings не выполняются.
+    """
+    plan = []
+    squarings = 0
+    i = b.bit_length() - 1
+    while i >= 0:
+        if not (b >> i) & 1:
+            squarings += 1
+            i -= 1
+            continue
+        # Окно [i..j] длиной не более k, заканчивающееся единичным битом
+        j = max(i - k + 1, 0)
+        while not (b >> j) & 1:
+            j += 1
+        squarings += i - j + 1
+        plan.append((squarings, ((b >> j) & ((1 << (i - j + 1)) - 1)) >> 1))
+        squarings = 0
+        i = j - 1
+    if squarings:
+        plan.append((squarings, None))
+    return plan
+
+def plan_table_size(plan):
+    """Сколько нечётных степеней a^1, a^3, ... нужно предвычислить для плана."""
+    return max(index for _, index in plan if index is not None) + 1
+
+def pow_window(a, b, mod, k=None):
+    """
+    Вычисляет (a^b) mod методом скользящего окна «слева направо».
+    Предвычисляются нечётные степени a^1, a^3, ..., a^(2^k - 1),
+    после чего на каждое окно тратится одно умножение вместо k.
+    """
+    if mod == 1:
+        return 0
+    if b == 0:
+        return 1
+    a = a % mod
+    plan = exponent_plan(b, k or window_size(b.bit_length()))
+    table = [a]
+    size = plan_table_size(plan)
+    if size > 1:
+        a2 = (a * a) % mod
+        for _ in range(size - 1):
+            table.append((table[-1] * a2) % mod)
+    result = table[plan[0][1]]
+    for squarings, index in plan[1:]:
+        for _ in range(squarings):
+            result = (result * result) % mod
+        if index is not None:
+            result = (result * table[index]) % mod
+    return result
+
+def pow_builtin(a, b, mod):
+    """Вычисляет (a^b) mod встроенной функцией pow (реализация на C)."""
+    return pow(a, b, mod)
+
+def pow_montgomery(a, b, mod):
+    """
+    Вычисляет (a^b) mod скользящим окном в форме Монтгомери
+    (редукция сдвигами и масками вместо деления); для чётного модуля — pow_window.
+    """
+    ctx = KeyContext(b, mod)
+    return ctx.pow_montgomery(a) if ctx.montgomery else pow_window(a, b, mod)
+
+POW_BACKENDS = {
+    "reference": pow_reference,
+    "window": pow_window,
+    "montgomery": pow_montgomery,
+    "builtin": pow_builtin,
+}
+
+# По умолчанию используется самая быстрая корректная реализация
+pow_backend = "builtin"
+_pow_impl = POW_BACKENDS[pow_backend]
+
+def set_pow_backend(name):
+    """Выбрать реализацию модульного возведения в степень: reference / window / montgomery / builtin."""
+    global pow_backend, _pow_impl
+    if name not in POW_BACKENDS:
+        raise ValueError(f"Неизвестная реализация возведения в степень: {name}")
+    pow_backend = name
+    _pow_impl = POW_BACKENDS[name]
+
+def my_pow(a, b, mod):
+    """
+    Вычисляет (a^b) mod выбранной реализацией (см. set_pow_backend).
+    """
+    return _pow_impl(a, b, mod)
+
+# ---------- Контексты открытого ключа ----------
+class KeyContext:
+    """
+    Предвычисления для многократного возведения в степень e по модулю n:
+    план окон (цепочка умножений) для e и константы Монтгомери для n.
+    Для e = 65537 план — 16 возведений в квадрат и одно умножение.
+    """
+
+    def __init__(self, e, n):
+        self.e = e
+        self.n = n
+        self.plan = exponent_plan(e, window_size(e.bit_length())) if e > 0 else []
+        self.table_size = plan_table_size(self.plan) if self.plan else 0
+        # Метод Монтгомери требует нечётного модуля
+        self.montgomery = n > 1 and n & 1 == 1
+        if self.montgomery:
+            self.shift = n.bit_length()          # R = 2^shift > n
+            self.mask = (1 << self.shift) - 1
+            self.n_prime = -pow(n, -1, 1 << self.shift) & self.mask  # -n^-1 mod R
+            self.r2 = (1 << (2 * self.shift)) % n                     # R^2 mod n
+
+    def pow(self, x):
+        """Вычисляет x^e mod n реализацией, выбранной set_pow_backend."""
+        if not self.plan or self.n == 1:
+            return _pow_impl(x, self.e, self.n)
+        if pow_backend == "window" or (pow_backend == "montgomery" and not self.montgomery):
+            return self.pow_plan(x)
+        if pow_backend == "montgomery":
+            return self.pow_montgomery(x)
+        return _pow_impl(x, self.e, self.n)
+
+    def pow_plan(self, x):
+        """Возведение по готовому плану окон с обычной редукцией по модулю."""
+        n = self.n
+        x = x % n
+        table = [x]
+        if self.table_size > 1:
+            x2 = (x * x) % n
+            for _ in range(self.table_size - 1):
+                table.append((table[-1] * x2) % n)
+        acc = table[self.plan[0][1]]
+        for squarings, index in self.plan[1:]:
+            for _ in range(squarings):
+                acc = (acc * acc) % n
+            if index is not None:
+                acc = (acc * table[index]) % n
+        return acc
+
+    def pow_montgomery(self, x):
+        """Возведение по готовому плану окон в форме Монтгомери."""
+        if not self.montgomery:
+            raise ValueError("Метод Монтгомери требует нечётного модуля")
+        if not self.plan:
+            return 1 % self.n
+        n, mask, shift, n_prime = self.n, self.mask, self.shift, self.n_prime
+
+        def mul(a, b):
+            # Умножение Монтгомери: a*b*R^-1 mod n
+            t = a * b
+            r = (t + (((t & mask) * n_prime) & mask) * n) >> shift
+            return r - n if r >= n else r
+
+        xm = mul(x % n, self.r2)
+        table = [xm]
+        if self.table_size > 1:
+            x2 = mul(xm, xm)
+            for _ in range(self.table_size - 1):
+                table.append(mul(table[-1], x2))
+        acc = table[self.plan[0][1]]
+        for squarings, index in self.plan[1:]:
+            for _ in range(squarings):
+                acc = mul(acc, acc)
+            if index is not None:
+                acc = mul(acc, table[index])
+        return mul(acc, 1)
+
+@lru_cache(maxsize=256)
+def key_context(e, n):
+    """Контекст ключа (e, n) из LRU-кэша: предвычисления выполняются один раз."""
+    return KeyContext(e, n)
+
+def pow_public(a, e, mod):
+    """Операция открытого ключа a^e mod n через кэшированный контекст ключа."""
+    return key_context(e, mod).pow(a)
+
 # Функции генерации простых чисел и RSA-ключей
 def is_prime_trial(n):
     """Проверка числа n на простоту методом пробного деления."""
@@ -91,25 +349,108 @@ def is_prime_fermat(n, k=5):
             return False
     return True
 
+def sieve_primes(limit):
+    """Все простые числа меньше limit (решето Эратосфена)."""
+    sieve = bytearray([1]) * limit
+    sieve[:2] = b"\x00\x00"
+    for i in range(2, int(limit ** 0.5) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return [i for i, v in enumerate(sieve) if v]
+
+# Нечётные простые до 2^15 (около 3500 чисел) для просеивания кандидатов
+SIEVE_PRIMES = sieve_primes(1 << 15)[1:]
+
+def miller_rabin_rounds(bits):
+    """
+    Число раундов Миллера-Рабина для случайного кандидата заданной длины,
+    при котором вероятность ошибки не превышает 2^-80.
+    """
+    for limit, rounds in ((1300, 2), (850, 3), (650, 4), (550, 5), (450, 6),
+                          (400, 7), (350, 8), (300, 9), (250, 12), (200, 15), (150, 18)):
+        if bits >= limit:
+            return rounds
+    return 27
+
+def is_prime_miller_rabin(n, k=None):
+    """
+    Проверка числа n на простоту тестом Миллера-Рабина.
+    Если число раундов k не задано, оно выбирается по битовой длине n.
+    """
+    if n < 4:
+        return n in (2, 3)
+    if n % 2 == 0:
+        return False
+    if k is None:
+        k = miller_rabin_rounds(n.bit_length())
+    # n - 1 = 2^s * t, t нечётно
+    t = n - 1
+    s = (t & -t).bit_length() - 1
+    t >>= s
+    for _ in range(k):
+        x = my_pow(my_randint(2, n - 2), t, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = (x * x) % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
 def generate_prime(bits):
-    """Генерация простого числа заданной битовой длины."""
+    """
+    Генерация простого числа заданной битовой длины.
+    От случайной нечётной точки просеивается окно последовательных нечётных
+    кандидатов по SIEVE_PRIMES, и только оставшиеся проверяются тестом Миллера-Рабина.
+    """
     if bits < 2:
         bits = 2
+    if bits <= 16:
+        # Короткие числа сами могут совпасть с простыми из решета — проверяем напрямую
+        odd = 1 if bits > 2 else 0  # Среди 2-битных чисел есть чётное простое 2
+        while True:
+            cand = my_getrandbits(bits) | (1 << (bits - 1)) | odd
+            if is_prime_miller_rabin(cand):
+                return cand
+    window = max(64, 8 * bits)  # Количество нечётных кандидатов в окне
+    top = 1 << bits
     while True:
-        cand = my_getrandbits(bits)
-        cand |= (1 << (bits - 1))  # Установка старшего бита
-        cand |= 1                  # Обеспечение нечетности числа
-        if is_prime_trial(cand) and is_prime_fermat(cand):
-            return cand
+        start = my_getrandbits(bits)
+        start |= (1 << (bits - 1))  # Установка старшего бита
+        start |= 1                  # Обеспечение нечётности числа
+        # sieve[i] соответствует кандидату start + 2*i
+        sieve = bytearray([1]) * window
+        for p in SIEVE_PRIMES:
+            # Первый индекс i, для которого p делит start + 2*i
+            i = ((p - start % p) * ((p + 1) >> 1)) % p
+            if i < window:
+                sieve[i::p] = bytes(len(range(i, window, p)))
+        for i in range(window):
+            if not sieve[i]:
+                continue
+            cand = start + 2 * i
+            if cand >= top:
+                break
+            if is_prime_miller_rabin(cand):
+                return cand
 
 def egcd(a, b):
-    """Расширенный алгоритм Евклида."""
-    if a == 0:
-        return b, 0, 1
-    gcd_val, x1, y1 = egcd(b % a, a)
-    x = y1 - (b // a) * x1
-    y = x1
-    return gcd_val, x, y
+    """
+    Расширенный алгоритм Евклида (итеративный).
+    Возвращает (g, x, y), где g = НОД(a, b) и a*x + b*y = g.
+    """
+    # Инвариант: old_r = a*old_x + b*old_y, r = a*x + b*y
+    old_r, r = b, a
+    old_x, x = 0, 1
+    old_y, y = 1, 0
+    while r:
+        q = old_r // r
+        old_r, r = r, old_r - q * r
+        old_x, x = x, old_x - q * x
+        old_y, y = y, old_y - q * y
+    return old_r, old_x, old_y
 
 def mod_inverse(e, phi):
     """Нахождение обратного элемента e (mod phi), если он существует."""
@@ -118,54 +459,272 @@ def mod_inverse(e, phi):
         return None
     return x % phi
 
-def generate_rsa_keys(bits=64):
+def rsa_keys_from_primes(p, q, *others):
     """
-    Генерация упрощённых RSA-ключей (e, d, n) для демонстрационных целей.
-    Возвращает словарь с ключами.
+    Построение RSA-ключей (e, d, n) из готовых простых p, q (и, для многопростого
+    RSA, дополнительных простых others). Возвращает словарь того же вида,
+    что и generate_rsa_keys().
     """
-    p = generate_prime(bits)
-    q = generate_prime(bits)
-    while q == p:
-        q = generate_prime(bits)
-    n = p * q
-    phi = (p - 1) * (q - 1)
+    primes = (p, q) + others
+    n = 1
+    phi = 1
+    for r in primes:
+        n *= r
+        phi *= r - 1
     e = 65537  # Стандартное значение открытой экспоненты, взаимно простое с функцией Эйлера
     if e >= phi or egcd(e, phi)[0] != 1:
         e = 3
         while e < phi and egcd(e, phi)[0] != 1:
             e += 2
     d = mod_inverse(e, phi)
-    return {'public': (e, n), 'private': (d, n), 'p': p, 'q': q, 'phi': phi}
+    return {'public': (e, n), 'private': (d, n), 'p': p, 'q': q, 'phi': phi,
+            'primes': list(primes), 'crt': crt_params(d, p, q),
+            'other_primes': other_prime_params(d, primes)}
+
+def _prime_worker(bits, worker_seed):
+    """Поиск простого числа в отдельном процессе со своим потоком случайных чисел."""
+    set_seed(worker_seed)
+    return generate_prime(bits)
+
+def _worker_seed():
+    """Независимое начальное значение генератора для процесса-исполнителя."""
+    return int.from_bytes(os.urandom(16), 'big')
+
+def generate_primes_parallel(bits, count, workers):
+    """
+    Поиск count различных простых чисел на пуле из workers процессов.
+    Запускается не меньше count независимых поисков, каждый со своим seed;
+    берутся первые завершившиеся, оставшиеся задачи отменяются.
+    """
+    primes = []
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {pool.submit(_prime_worker, bits, _worker_seed())
+                   for _ in range(max(workers, count))}
+        while len(primes) < count:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                prime = fut.result()
+                if prime not in primes and len(primes) < count:
+                    primes.append(prime)
+            if len(primes) + len(pending) < count:
+                # Совпавшие результаты: запускаем недостающие поиски
+                pending |= {pool.submit(_prime_worker, bits, _worker_seed())
+                            for _ in range(count - len(primes) - len(pending))}
+    finally:
+        # Не ждём проигравшие поиски: они завершатся в фоне
+        pool.shutdown(wait=False, cancel_futures=True)
+    return primes
+
+def prime_sizes(bits, primes):
+    """
+    Длины простых для модуля длиной 2*bits из primes сомножителей
+    (при primes = 2 — два простых по bits бит, как и раньше).
+    """
+    total = 2 * bits
+    return [total // primes + (1 if i < total % primes else 0) for i in range(primes)]
+
+def generate_rsa_keys(bits=64, workers=None, primes=2):
+    """
+    Генерация упрощённых RSA-ключей (e, d, n) для демонстрационных целей.
+    Возвращает словарь с ключами.
+    bits — длина каждого из двух простых; при primes > 2 модуль той же длины
+    (2*bits) собирается из primes более коротких простых (многопростой RSA).
+    При workers > 1 простые числа ищутся параллельно на пуле процессов
+    (на Windows вызывать только из-под if __name__ == "__main__").
+    """
+    if primes < 2:
+        raise ValueError("Модуль RSA должен содержать не меньше двух простых")
+    sizes = prime_sizes(bits, primes)
+    found = []
+    if workers and workers > 1:
+        for size in sorted(set(sizes), reverse=True):
+            found += generate_primes_parallel(size, sizes.count(size), workers)
+        return rsa_keys_from_primes(*found)
+    for size in sizes:
+        r = generate_prime(size)
+        while r in found:
+            r = generate_prime(size)
+        found.append(r)
+    return rsa_keys_from_primes(*found)
+
+# ---------- Закрытый ключ в формате КТО (китайская теорема об остатках) ----------
+CRT_FIELDS = ("p", "q", "dp", "dq", "qinv")
+
+def crt_params(d, p, q):
+    """
+    Параметры КТО для закрытого ключа: (p, q, dP, dQ, qInv),
+    где dP = d mod (p-1), dQ = d mod (q-1), qInv = q^-1 mod p.
+    """
+    return p, q, d % (p - 1), d % (q - 1), mod_inverse(q, p)
+
+def other_prime_params(d, primes):
+    """
+    Параметры дополнительных простых многопростого ключа (RFC 8017, otherPrimeInfos):
+    для r_i, i >= 3 — тройки (r_i, d_i = d mod (r_i - 1), t_i = (r_1*...*r_{i-1})^-1 mod r_i).
+    """
+    params = []
+    prefix = primes[0] * primes[1]
+    for r in primes[2:]:
+        params.append((r, d % (r - 1), mod_inverse(prefix % r, r)))
+        prefix *= r
+    return params
+
+def export_private_key(keys):
+    """
+    Преобразование результата generate_rsa_keys() в словарь для JSON-файла ключа.
+    Помимо d, n, e сохраняются параметры КТО, а для многопростого ключа —
+    список other_primes из словарей {"r", "d", "t"}.
+    """
+    d, n = keys['private']
+    key = {"d": d, "n": n, "e": keys['public'][0]}
+    key.update(zip(CRT_FIELDS, keys['crt']))
+    if keys.get('other_primes'):
+        key["other_primes"] = [{"r": r, "d": d_i, "t": t_i} for r, d_i, t_i in keys['other_primes']]
+    return key
+
+def load_private_key(key):
+    """
+    Закрытый ключ из словаря JSON-файла в виде кортежа для rsa_sign/rsa_decrypt.
+    Если в словаре есть параметры КТО, возвращается (d, n, p, q, dP, dQ, qInv),
+    для многопростого ключа к нему добавляется кортеж троек (r_i, d_i, t_i),
+    иначе (старый формат {"d", "n", "e"}) — просто (d, n).
+    """
+    if all(f in key for f in CRT_FIELDS):
+        priv = (key["d"], key["n"]) + tuple(key[f] for f in CRT_FIELDS)
+        if key.get("other_primes"):
+            priv += (tuple((o["r"], o["d"], o["t"]) for o in key["other_primes"]),)
+        return priv
+    return key["d"], key["n"]
 
 # ---------- Вспомогательные функции конвертации ----------
 def text_to_int(text):
     """Преобразование текста в целое число (байты big-endian)."""
     return int.from_bytes(text.encode('utf-8'), 'big')
 
+def int_to_bytes(num):
+    """Преобразование целого числа в байты big-endian минимальной длины."""
+    return num.to_bytes((num.bit_length() + 7) // 8, 'big')
+
 def int_to_text(num):
     """Преобразование большого целого числа обратно в строку (UTF-8)."""
     if num == 0:
         return ""
-    length = (num.bit_length() + 7) // 8
-    return num.to_bytes(length, 'big').decode('utf-8', errors='ignore')
+    return int_to_bytes(num).decode('utf-8', errors='ignore')
 
 # ---------- Основные RSA-функции (шифрование/дешифрование/подпись/проверка) ----------
 def rsa_encrypt(m_int, pubkey):
     """RSA-шифрование числа m_int открытым ключом (e, n)."""
     e, n = pubkey
-    return my_pow(m_int, e, n)
+    return pow_public(m_int, e, n)
+
+def rsa_private(x_int, privkey):
+    """
+    Операция закрытого ключа x^d mod n.
+    Ключ (d, n) — полное возведение в степень по модулю n;
+    ключ (d, n, p, q, dP, dQ, qInv) — две половинные степени и сборка по КТО (Гарнер);
+    многопростой ключ — ещё по одной короткой степени на каждое r_i (RFC 8017, 5.1.2).
+    """
+    if len(privkey) == 2:
+        d, n = privkey
+        return my_pow(x_int, d, n)
+    _, n, p, q, dp, dq, qinv = privkey[:7]
+    m1 = my_pow(x_int % p, dp, p)
+    m2 = my_pow(x_int % q, dq, q)
+    h = (qinv * (m1 - m2)) % p
+    m = m2 + h * q
+    if len(privkey) > 7:
+        prefix = p * q
+        for r, d_i, t_i in privkey[7]:
+            m_i = my_pow(x_int % r, d_i, r)
+            m += prefix * (((m_i - m) * t_i) % r)
+            prefix *= r
+    return m
 
 def rsa_decrypt(c_int, privkey):
-    """RSA-расшифрование числа c_int закрытым ключом (d, n)."""
-    d, n = privkey
-    return my_pow(c_int, d, n)
+    """RSA-расшифрование числа c_int закрытым ключом (d, n) или (d, n, p, q, dP, dQ, qInv)."""
+    return rsa_private(c_int, privkey)
 
 def rsa_sign(m_int, privkey):
-    """RSA-подпись числа m_int закрытым ключом (d, n)."""
-    d, n = privkey
-    return my_pow(m_int, d, n)
+    """RSA-подпись числа m_int закрытым ключом (d, n) или (d, n, p, q, dP, dQ, qInv)."""
+    return rsa_private(m_int, privkey)
 
 def rsa_verify(m_int, s_int, pubkey):
     """Проверка подписи s_int для сообщения m_int открытым ключом (e, n)."""
     e, n = pubkey
-    return m_int % n == my_pow(s_int, e, n)
+    return m_int % n == pow_public(s_int, e, n)
+
+def rsa_verify_batch(items):
+    """
+    Проверка списка подписей.
+    items — последовательность троек (m_int, s_int, (e, n)); возвращает список
+    bool того же порядка, что и rsa_verify для каждой тройки.
+    Тройки группируются по ключу, и каждая подпись проверяется отдельно через
+    общий для группы KeyContext. Выигрыш — только в подготовке контекста:
+    для e = 65537 проверка не быстрее цикла rsa_verify по тем же ключам.
+    Рандомизированные пакетные тесты (∏ s_i^r_i)^e == ∏ m_i^r_i здесь не
+    используются: в Z_n* есть элементы малого порядка, и владелец
+    разложения n проводит через такой тест неверную подпись.
+    """
+    results = [False] * len(items)
+    groups = {}
+    for i, (m_int, s_int, pubkey) in enumerate(items):
+        groups.setdefault(tuple(pubkey), []).append(i)
+    for (e, n), idxs in groups.items():
+        ctx = key_context(e, n)
+        for i in idxs:
+            results[i] = items[i][0] % n == ctx.pow(items[i][1] % n)
+    return results
+
+# ---------- Подпись хэша (hash-then-sign) ----------
+# Версии подписи: 1 — подписывается само число сообщения (по модулю n),
+# 2 — подписывается SHA-256 хэш, дополненный до длины модуля
+SIG_VERSION = 2
+
+# Префикс DigestInfo для SHA-256 (PKCS #1 v1.5)
+SHA256_DIGEST_INFO = bytes.fromhex("3031300d060960864801650304020105000420")
+
+def encode_digest(digest, n):
+    """
+    Кодирование хэша в число меньше n.
+    Если модуль позволяет — EMSA-PKCS1-v1_5: 00 01 FF..FF 00 || DigestInfo || H.
+    Для коротких учебных модулей хэш усекается до n.bit_length() - 1 бит.
+    """
+    k = (n.bit_length() + 7) // 8
+    t = SHA256_DIGEST_INFO + digest
+    if k >= len(t) + 11:
+        return int.from_bytes(b"\x00\x01" + b"\xff" * (k - len(t) - 3) + b"\x00" + t, 'big')
+    h = int.from_bytes(digest, 'big')
+    extra = len(digest) * 8 - (n.bit_length() - 1)
+    return h >> extra if extra > 0 else h
+
+def rsa_sign_hash(digest, privkey):
+    """RSA-подпись готового SHA-256 хэша закрытым ключом."""
+    return rsa_sign(encode_digest(digest, privkey[1]), privkey)
+
+def rsa_verify_hash(digest, s_int, pubkey):
+    """Проверка подписи s_int для SHA-256 хэша открытым ключом (e, n)."""
+    e, n = pubkey
+    if not 0 <= s_int < n:
+        return False
+    return encode_digest(digest, n) == pow_public(s_int, e, n)
+
+def rsa_sign_bytes(data, privkey):
+    """Подпись произвольных данных: SHA-256, затем rsa_sign_hash."""
+    return rsa_sign_hash(hashlib.sha256(data).digest(), privkey)
+
+def rsa_verify_bytes(data, s_int, pubkey):
+    """Проверка подписи, созданной rsa_sign_bytes."""
+    return rsa_verify_hash(hashlib.sha256(data).digest(), s_int, pubkey)
+
+def rsa_verify_bytes_batch(items):
+    """Пакетная проверка подписей rsa_sign_bytes: items — тройки (data, s_int, (e, n))."""
+    results = [False] * len(items)
+    idxs, encoded = [], []
+    for i, (data, s_int, (e, n)) in enumerate(items):
+        if 0 <= s_int < n:  # Вне диапазона — неверная подпись
+            idxs.append(i)
+            encoded.append((encode_digest(hashlib.sha256(data).digest(), n), s_int, (e, n)))
+    for i, ok in zip(idxs, rsa_verify_batch(encoded)):
+        results[i] = ok
+    return results
@@ -0,0 +1,119 @@
+"""
+Пул процессов для операций подписи в УЦ.
+Обработчики FastAPI не выполняют возведение в степень в цикле событий:
+задача отправляется в пул процессов и ожидается через await, поэтому
+GET-запросы (/ca_cert и др.) не стоят в очереди за подписью.
+Очередь ограничена: при переполнении sign() сразу выбрасывает SigningQueueFull,
+а сервис отвечает 503 с заголовком Retry-After (SigningExecutor.overload_as_503).
+"""
+
+import asyncio, os, threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from fastapi import HTTPException
+import rsa_utils as ru
+
+def sign_chunk(datas, privkey):
+    """Подпись списка байтовых строк в одном процессе-исполнителе."""
+    return [ru.rsa_sign_bytes(data, privkey) for data in datas]
+
+class SigningQueueFull(Exception):
+    """Очередь подписи заполнена, задачу нужно повторить позже."""
+
+class SigningExecutor:
+    def __init__(self, workers=None, max_queue=64, retry_after=1):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue      # Задач в работе и в очереди одновременно
+        self.retry_after = retry_after  # Значение Retry-After при переполнении, с
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    def _start(self, fn, args_list):
+        """
+        Занять места под все задачи сразу (или SigningQueueFull) и отправить их
+        в пул. Место освобождается по завершении задачи в пуле, а не ожидающей
+        её корутины: после отмены запроса задача, уже начатая процессом,
+        продолжает занимать место, пока не закончится.
+        """
+        with self._lock:
+            if self._pending + len(args_list) > self.max_queue:
+                self._rejected += 1
+                raise SigningQueueFull()
+            self._pending += len(args_list)
+            self._submitted += len(args_list)
+        futures = []
+        try:
+            for args in args_list:
+                future = self._get_pool().submit(fn, *args)
+                future.add_done_callback(self._release)
+                futures.append(asyncio.wrap_future(future))
+        except BaseException:
+            for _ in range(len(args_list) - len(futures)):
+                self._release()
+            raise
+        return futures
+
+    async def submit(self, fn, *args):
+        """Выполнить fn(*args) в пуле процессов и дождаться результата."""
+        return await self._start(fn, [args])[0]
+
+    @contextmanager
+    def overload_as_503(self):
+        """SigningQueueFull внутри блока превращается в ответ 503 с Retry-After."""
+        try:
+            yield
+        except SigningQueueFull:
+            raise HTTPException(503, "Очередь подписи переполнена",
+                                headers={"Retry-After": str(self.retry_after)})
+
+    async def sign(self, data, privkey):
+        """Подпись байтов (rsa_sign_bytes) в пуле процессов."""
+        return await self.submit(ru.rsa_sign_bytes, data, privkey)
+
+    async def sign_many(self, datas, privkey):
+        """
+        Подпись списка байтовых строк: список делится на части по числу процессов
+        (но не больше max_queue, иначе пакет не поместился бы даже в пустую очередь),
+        каждая часть — одна задача пула. Порядок подписей совпадает с порядком datas.
+        """
+        if not datas:
+            return []
+        parts = max(1, min(self.workers, self.max_queue))
+        size = -(-len(datas) // parts)  # Округление вверх
+        chunks = [datas[i:i + size] for i in range(0, len(datas), size)]
+        # Места занимаются сразу под все части: пакет либо целиком принят, либо отклонён
+        parts = await asyncio.gather(*self._start(sign_chunk, [(chunk, privkey) for chunk in chunks]))
+        return [sig for part in parts for sig in part]
+
+    def stats(self):
+        """Глубина очереди и счётчики задач."""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self._pending,
+                "max_queue": self.max_queue,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,95 @@
+"""
+Исходящие HTTP-запросы клиентов и УЦ.
+Transport — общий requests.Session: соединения keep-alive переиспользуются
+(пул на каждый хост), у каждого запроса есть тайм-аут, а сбои соединения
+и ответы 502/503/504 повторяются с экспоненциальной задержкой.
+POST повторяется только при ошибке установки соединения (запрос до сервера
+не дошёл) — выдача сертификата не выполнится дважды.
+
+AsyncTransport — те же запросы для asyncio: выполняются в потоках, не блокируя
+цикл событий. BackgroundLoop — цикл событий в отдельном потоке, в который
+GUI передаёт корутины и получает concurrent.futures.Future.
+"""
+
+import asyncio, threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = 3.05   # С
+READ_TIMEOUT = 10        # С
+RETRIES = 3
+BACKOFF = 0.2            # Задержки повторов: 0.2, 0.4, 0.8 с
+POOL_MAXSIZE = 16        # Соединений на хост
+
+class Transport:
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=RETRIES,
+                 backoff=BACKOFF, pool_maxsize=POOL_MAXSIZE):
+        self.timeout = timeout
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff, status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset({"GET", "HEAD"}),
+                      respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get_json(self, url, **kwargs):
+        return self.get(url, **kwargs).json()
+
+    def post_json(self, url, data, **kwargs):
+        return self.post(url, json=data, **kwargs).json()
+
+    def close(self):
+        self.session.close()
+
+class AsyncTransport:
+    """Запросы Transport в виде корутин (через asyncio.to_thread)."""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def get(self, url, **kwargs):
+        return await asyncio.to_thread(self.transport.get, url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await asyncio.to_thread(self.transport.post, url, **kwargs)
+
+    async def get_json(self, url, **kwargs):
+        return await asyncio.to_thread(self.transport.get_json, url, **kwargs)
+
+    async def post_json(self, url, data, **kwargs):
+        return await asyncio.to_thread(self.transport.post_json, url, data, **kwargs)
+
+    async def call(self, fn, *args):
+        """Любая блокирующая функция (например, HttpCache.get_json) без блокировки цикла."""
+        return await asyncio.to_thread(fn, *args)
+
+class BackgroundLoop:
+    """Цикл asyncio в фоновом потоке для программ без своего цикла (GUI)."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        """Запустить корутину в фоновом цикле; возвращает concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+default_transport = Transport()
@@ -0,0 +1,80 @@
+"""
+Кэш с ограниченным временем жизни записей (TTL) и вытеснением LRU.
+Может сохраняться в JSON-файл, чтобы перезапущенный клиент стартовал
+с заполненным кэшем. Ключи — строки, значения — данные, допустимые в JSON.
+"""
+
+import json, threading, time
+from collections import OrderedDict
+from pathlib import Path
+from issuance import atomic_write_text
+
+class TTLCache:
+    def __init__(self, maxsize=128, ttl=600.0, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl                                 # Время жизни записи, с
+        self.path = Path(path) if path is not None else None
+        self._items = OrderedDict()                    # key -> (expires, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def _load(self):
+        # Сроки хранятся в time.time(): они должны пережить перезапуск
+        try:
+            saved = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return  # Повреждённый файл кэша не мешает запуску
+        now = time.time()
+        for key, (expires, value) in saved.items():
+            if expires > now:
+                self._items[key] = (expires, value)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def _save(self):
+        """Сохранение в файл; вызывается под _lock."""
+        if self.path is not None:
+            atomic_write_text(self.path, json.dumps({k: list(v) for k, v in self._items.items()}))
+
+    def get(self, key):
+        """Значение или None, если записи нет или её срок истёк."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] <= time.time():
+                del self._items[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._items[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            self._save()
+
+    def invalidate(self, key=None):
+        """Удалить запись key (или все записи)."""
+        with self._lock:
+            if key is None:
+                self._items.clear()
+            elif self._items.pop(key, None) is None:
+                return
+            self._save()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._items), "maxsize": self.maxsize, "ttl": self.ttl,
+                    "hits": self.hits, "misses": self.misses}